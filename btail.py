@@ -11,6 +11,9 @@ import sys
 import re
 import fileinput
 import getopt
+import json
+import zlib
+from collections import OrderedDict
 
 Colors = {
     "name": '\033[0m',
@@ -264,6 +267,81 @@ def print_format_log(log):
     print log,
 
 
+class BinaryVerdictCache(object):
+    """is_binary() verdicts keyed by (st_dev, st_ino, first block crc32).
+
+    is_binary() looks for a null byte in the whole file, so each entry keeps
+    the size that was checked; when a text file only grew, just the appended
+    bytes are read. Optionally loaded from and saved to ~/.cache/ctail so
+    restarts do not probe the same files again."""
+
+    MAX_ENTRIES = 100000
+
+    def __init__(self):
+        self.verdicts = OrderedDict()  # key -> [checked size, binary]
+        self.hits = 0
+        self.misses = 0
+        self.path = None
+
+    def get(self, key):
+        entry = self.verdicts.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.verdicts[key] = entry
+        return entry
+
+    def put(self, key, size, verdict):
+        self.verdicts.pop(key, None)
+        self.verdicts[key] = [size, verdict]
+        while len(self.verdicts) > self.MAX_ENTRIES:
+            self.verdicts.popitem(last=False)
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                for dev, ino, crc, size, verdict in json.load(f):
+                    self.verdicts[(dev, ino, crc)] = [size, verdict]
+        except (IOError, OSError, ValueError, TypeError):
+            return False
+        return True
+
+    def save(self):
+        if self.path is None:
+            return False
+        try:
+            try:
+                os.makedirs(os.path.dirname(self.path))
+            except OSError:
+                pass  # 이미 있음
+            tmp_path = '%s.%d' % (self.path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump([list(key) + entry for key, entry in self.verdicts.items()], f)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError):
+            return False
+        return True
+
+_binary_verdicts = BinaryVerdictCache()
+
+
+def get_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ctail')
+
+
+def has_null_byte(f):
+    CHUNKSIZE = 1024
+    while 1:
+        chunk = f.read(CHUNKSIZE)
+        if b'\0' in chunk:  # found null byte
+            return True
+        if len(chunk) < CHUNKSIZE:
+            return False  # done
+
+
 def is_binary(filename):
     """Return true if the given filename is binary.
     @raise EnvironmentError: if the file does not exist or cannot be accessed.
@@ -272,13 +350,26 @@ def is_binary(filename):
     @author: Jorge Orpinel <jorge@orpinel.com>"""
     with open(filename, 'rb') as f:
         CHUNKSIZE = 1024
-        while 1:
-            chunk = f.read(CHUNKSIZE)
-            if b'\0' in chunk:  # found null byte
-                return True
-            if len(chunk) < CHUNKSIZE:
-                break  # done
-    return False
+        chunk = f.read(CHUNKSIZE)
+        if b'\0' in chunk:  # found null byte
+            return True
+        if len(chunk) < CHUNKSIZE:
+            return False  # done
+
+        st = os.fstat(f.fileno())
+        key = (st.st_dev, st.st_ino, zlib.crc32(chunk))
+        entry = _binary_verdicts.get(key)
+        if entry is not None and (entry[1] or entry[0] == st.st_size):
+            return entry[1]
+
+        # 이전에 text 로 확인한 파일이 커졌으면 늘어난 부분만 읽는다
+        if entry is not None and CHUNKSIZE < entry[0] < st.st_size:
+            f.seek(entry[0])
+        verdict = has_null_byte(f)
+        size = f.tell()
+
+    _binary_verdicts.put(key, size, verdict)
+    return verdict
 
 
 def newest_file_in(path):
@@ -470,11 +561,35 @@ def reopen_tail(filename, follow_file, target_filename, target_file_offset):
     return f, target_filename, target_file_offset, False
 
 
+class Backoff(object):
+    """Interval between checks of a tailed file.
+
+    Right after data arrives the next check is immediate; while the file
+    stays idle the interval doubles from min_interval up to max_interval.
+    The same object is used by tail() and the --retry loop."""
+
+    MIN_INTERVAL = 0.01
+
+    def __init__(self, max_interval=1.0):
+        self.min_interval = min(self.MIN_INTERVAL, max_interval)
+        self.max_interval = max_interval
+        self.interval = 0
+
+    def reset(self):
+        self.interval = 0
+
+    def next(self):
+        interval = self.interval
+        self.interval = min(max(interval * 2, self.min_interval), self.max_interval)
+        return interval
+
+
 def tail(filename, follow_file):
     target, exist = get_tail_filename(filename, follow_file)
     if not exist:
         return
 
+    offset = None
     if _last_target_filename == '':
         f, error = open_tail(target)
         if error:
@@ -487,7 +602,9 @@ def tail(filename, follow_file):
         if error:
             return
 
+    interval = 0
     while True:
+        position = (target, offset)
         offset, error = keep_tail(f)
         if error:
             return
@@ -499,13 +616,24 @@ def tail(filename, follow_file):
         if error:
             return
 
-        time.sleep(0.01)
+        if position != (target, offset):
+            if _verbose and interval == _backoff.max_interval:
+                print colorize_ok('>>> Interval :0 sec, %s is active' % target)
+            _backoff.reset()
+        previous_interval, interval = interval, _backoff.next()
+        if _verbose and interval == _backoff.max_interval and previous_interval != interval:
+            print colorize_ok('>>> Interval :%s sec, %s is idle' % (interval, target))
+
+        time.sleep(interval)
 
 
 def sig_handler(signal, frame):
     if _verbose:
         offset, exist = get_offset(_last_target_filename)
         print colorize_ok("\n>>> Open files :%s" % _fileoffset_repository),
+        print colorize_ok("\n>>> Interval :%s sec" % _backoff.interval),
+        print colorize_ok("\n>>> Binary Cache :hits {:,}, misses {:,}".format(
+            _binary_verdicts.hits, _binary_verdicts.misses)),
         if _follow_file:
             print colorize_ok("\n>>> Last Open :%s" % _last_target_filename),
             print colorize_ok(", offset :{:,}".format(offset))
@@ -528,7 +656,9 @@ def usage():
     print 'Options:'
     print '--version      print version'
     print '-f             follow FILE, not to tail the newest file in the directory of FILE'
-    print '-r, --retry    keep trying to open a file if it is inaccessible. sleep for 1.0 sec between retry iterations'
+    print '-r, --retry    keep trying to open a file if it is inaccessible. sleep up to --max-interval sec between retry iterations'
+    print '--max-interval SEC  maximum sec between checks of an idle file, default: 1.0'
+    print '--binary-cache remember text/binary checks of files in ~/.cache/ctail across runs'
     print '-v, --verbose  print messages verbosely'
     print '--simple       to print simple format'
     print '-N             not to print name field of cilog'
@@ -593,9 +723,12 @@ def main():
     _follow_file = False
     retry = False
 
+    global _backoff
+    _backoff = Backoff()
+
     try:
         options, args = getopt.getopt(sys.argv[1:], "vfhrNIDTLSC", [
-            "simple", "help", "retry", "version", "verbose"])
+            "simple", "help", "retry", "version", "verbose", "max-interval=", "binary-cache"])
     except getopt.GetoptError as err:
         print str(err)
         print ""
@@ -631,6 +764,14 @@ def main():
             _skip_code = True
         if op == "--simple":
             _print_simple_format = True
+        if op == "--max-interval":
+            try:
+                _backoff = Backoff(float(p))
+            except ValueError:
+                print 'invalid --max-interval: %s' % p
+                sys.exit(1)
+        if op == "--binary-cache":
+            _binary_verdicts.load(os.path.join(get_cache_dir(), 'btail_binary_verdicts.json'))
 
     if not sys.stdin.isatty():
         cat()
@@ -639,12 +780,15 @@ def main():
     if len(args) > 0:
         filename = args[0]
 
-    while True:
-        tail(filename, _follow_file)
-        if retry:
-            time.sleep(1)
-        else:
-            break
+    try:
+        while True:
+            tail(filename, _follow_file)
+            if retry:
+                time.sleep(_backoff.next())
+            else:
+                break
+    finally:
+        _binary_verdicts.save()
 
 
 if __name__ == '__main__':
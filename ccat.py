@@ -11,6 +11,9 @@ import sys
 import re
 import fileinput
 import getopt
+import mmap
+import ctypes
+import ctypes.util
 import datetime
 from dateutil.parser import parse
 
@@ -331,23 +334,95 @@ def get_target_filename(filename, follow_file):
             return None, False   
     return target_file, True
 
+_mmap_window_size = 64 * 1024 * 1024
+_bulk_window_size = 8 * 1024 * 1024
+
+POSIX_FADV_SEQUENTIAL = 2
+POSIX_FADV_WILLNEED = 3
+POSIX_FADV_DONTNEED = 4
+
+_libc = None
+
+def fadvise(fd, offset, length, advice):
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c'))
+            _libc.posix_fadvise64.argtypes = [ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_int]
+        except Exception as e:
+            _libc = False
+    if _libc:
+        _libc.posix_fadvise64(fd, offset, length, advice)
+
+def mmap_lines(f):
+    """Yield (line, offset after the line) of f through read-only mmap windows.
+    Each window is unmapped once the scan moves past it, so memory use stays
+    flat for multi-GB files.
+    With -B, the pages of a window are dropped from the page cache after it
+    is printed and the scan is kept under --max-rate MB/s."""
+    global _bulk, _max_rate
+    size = os.fstat(f.fileno()).st_size
+    pos = 0
+    default_window_size = _mmap_window_size
+    if _bulk:
+        default_window_size = _bulk_window_size
+        fadvise(f.fileno(), 0, 0, POSIX_FADV_SEQUENTIAL)
+        started = time.time()
+        scanned = 0
+    window_size = default_window_size
+    while pos < size:
+        base = pos - pos % mmap.ALLOCATIONGRANULARITY
+        length = min(window_size, size - base)
+        last_window = base + length == size
+        if _bulk and not last_window:
+            fadvise(f.fileno(), base + length, _bulk_window_size, POSIX_FADV_WILLNEED)
+        m = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=base)
+        try:
+            start = pos - base
+            while True:
+                end = m.find('\n', start)
+                if end < 0:
+                    break
+                yield m[start:end + 1], base + end + 1
+                start = end + 1
+            if last_window and start < length:
+                yield m[start:length], size
+                start = length
+        finally:
+            m.close()
+
+        if base + start == pos:
+            window_size *= 2
+        else:
+            window_size = default_window_size
+        pos = base + start
+
+        if _bulk:
+            done = pos
+            if pos < size:
+                done = pos - pos % mmap.PAGESIZE
+            if done > scanned:
+                fadvise(f.fileno(), scanned, done - scanned, POSIX_FADV_DONTNEED)
+                scanned = done
+            if _max_rate:
+                ahead = scanned / (_max_rate * 1024 * 1024) - (time.time() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
 def ccat_lines(f):
     global _filename_searching_only
     exist = False
-    while True:
-        try:
-            line = f.readline()
-        except Exception as e:
-            if _verbose: print colorize_ok('>>> Error :' % e)
-            f.close()
-            return 0, True
-        if line: 
+    offset = 0
+    try:
+        for line, offset in mmap_lines(f):
             exist = print_format_log(line)
             sys.stdout.softspace=0
             if _filename_searching_only: 
               if exist: break
-        else: break
-    offset = f.tell()
+    except Exception as e:
+        if _verbose: print colorize_ok('>>> Error :%s' % e)
+        f.close()
+        return False, 0, True
     f.close()
     return exist, offset, False
 
@@ -448,6 +523,8 @@ def usage():
     print '-e             specify log end datetime : ex) 2019-05-10T13:10:00'
     print '-t             print filename only after datetime searching'
     print '-C             disable coloring'
+    print '-B             bulk scan, drop printed pages from the page cache'
+    print '--max-rate=MB  read at most MB megabytes per second, implies -B'
     print '--version      print version'
     print '-v, --verbose  print messages verbosely'
     print '-V,            print last message only'
@@ -479,6 +556,10 @@ def main():
     global _filename_searching_only
     _filename_searching_only = False
 
+    global _bulk, _max_rate
+    _bulk = False
+    _max_rate = None
+
     signal.signal(signal.SIGINT, sig_handler)
     if len(sys.argv) == 1 and not sys.stdin.isatty():
         cat()
@@ -506,7 +587,7 @@ def main():
     _filenmae_searcing_fileoffset_repository = {}
 
     try:
-        options, args = getopt.getopt(sys.argv[1:], "tCVvhb:e:", ["help", "version", "verbose"])
+        options, args = getopt.getopt(sys.argv[1:], "tCBVvhb:e:", ["help", "version", "verbose", "max-rate="])
     except getopt.GetoptError as err:
         print str(err)
         print ""
@@ -523,6 +604,15 @@ def main():
             _filename_searching_only = True
         if op == "-C":
             _disableColoring = True
+        if op == "-B":
+            _bulk = True
+        if op == "--max-rate":
+            try:
+                _max_rate = float(p)
+            except ValueError:
+                print colorize_ok('>>> Error : --max-rate option : %s' % p)
+                sys.exit(1)
+            _bulk = True
         if op == "-V":
             _verboseLast = True
         if op == "-b":
@@ -5,17 +5,32 @@ Created on 2014. 06. 09
 @author: <mwpark@castis.com>
 '''
 import argparse
+import codecs
+import ctypes
+import ctypes.util
 import datetime
+import errno
 import fileinput
+import fnmatch
+import functools
+import heapq
+import itertools
 import os
+import queue
 import re
+import select
 import signal
+import stat
+import struct
 import sys
+import threading
 import time
 import json
+import math
+import mmap
+import zlib
 from collections import OrderedDict # for python 3.6
 
-import chardet
 from dateutil import parser
 
 program_version = "0.1.4"
@@ -116,10 +131,26 @@ class Options:
         self.skip_code = False
         self.print_simple_format = False
         self.follow_file = False
+        self.keep_open = False
         self.fileoffset_repository = {}
         self.last_target_filename = ""
         self.colors = True
         self.color_file = None
+        self.poll = False
+        self.binary_cache = False
+        self.name_filter = None
+        self.recursive = False
+        self.rollover = None
+        self.backoff = Backoff()
+        self.lines = None
+        self.raw = False
+        self.read_ahead = None
+        self.bulk = False
+        self.max_rate = None
+        self.catch_up = None
+        self.catch_up_threshold = 16
+        self.sample_every = 100
+        self.event_clock = EventClock()
 
 _fileoffset_repository = {}
 
@@ -161,44 +192,90 @@ def apply_color_to_log_parts(log_map):
     log_map['description'] = apply_color(log_map['description'], 'description')
     return log_map
 
+def build_event_type_names():
+    # event code -> 이름, SU 는 session event 와 합친 code 만 넣는다
+    names = {}
+    for major, name in event_type_major.items():
+        if name == 'SU':
+            for minor, session in session_event_type.items():
+                names[major | minor] = name + '/' + session
+        else:
+            names[major] = name
+    return names
+
+EVENT_TYPE_NAMES = build_event_type_names()
+EVENT_LEVEL_NAMES = {str(level): name for level, name in event_level.items()}
+
 def get_event_type_string(event):
     try:
-        s = event_type_major[int(event, 0) & 0xFFFF0000]
-        if s == 'SU':
-            s = s + '/' + session_event_type[int(event, 0) & 0xFFFF]
-        return s
+        code = int(event, 0)
     except Exception as e:
         return ''
+    name = EVENT_TYPE_NAMES.get(code)
+    if name is None:
+        name = EVENT_TYPE_NAMES.get(code & 0xFFFF0000, '')
+    return name
 
 def get_event_level_string(level):
+    name = EVENT_LEVEL_NAMES.get(level)
+    if name is not None:
+        return name
     try:
-        s = event_level[int(level)]
-        return s
+        return event_level.get(int(level), '')
     except Exception as e:
         return ''
 
+# eventlog 는 몇 안 되는 code 가 대부분이라 raw 값 -> 색칠한 문자열을 기억한다, load_colors() 에서 비운다
+@functools.lru_cache(maxsize=256)
+def render_event_type(event):
+    return apply_color(get_event_type_string(event), 'event')
 
-def get_time_string_gmt_to_kst(timestamp):
+@functools.lru_cache(maxsize=256)
+def render_event_level(level):
+    level = get_event_level_string(level)
+    if level in ['severe', 'error', 'fail', 'warning', 'exception', 'except', 'critical']:
+        return apply_color(level, 'error')
+    return apply_color(level, 'level')
+
+
+KST = datetime.timezone(datetime.timedelta(hours=9), 'KST')
+
+def parse_timezone(value):
+    """--timezone 값을 tzinfo 로 바꾼다: UTC, +09:00, -0530, +9 또는 Asia/Seoul 같은 tz 이름"""
+    if value.upper() in ('UTC', 'GMT', 'Z'):
+        return datetime.timezone.utc
+    m = re.fullmatch(r'([+-])(\d{1,2}):?(\d{2})?', value)
+    if m:
+        sign, hours, minutes = m.groups()
+        offset = datetime.timedelta(hours=int(hours), minutes=int(minutes or 0))
+        if offset >= datetime.timedelta(hours=24):
+            raise argparse.ArgumentTypeError(f'invalid timezone offset: {value}')
+        return datetime.timezone(-offset if sign == '-' else offset)
     try:
-        s = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(float(timestamp)+32400))
-        return s, False, ""
-    except Exception as e:
-        return '', False, str(e)
+        import zoneinfo
+        return zoneinfo.ZoneInfo(value)
+    except Exception:
+        raise argparse.ArgumentTypeError(f'unknown timezone: {value}')
 
 
-def translate(log):
-    try:
-        event, level, datetime, description = log.split(',', 3)
-    except Exception as e:
-        return log, False, str(e)
-    
-    event = get_event_type_string(event)
-    level = get_event_level_string(level)
-    datetime, error, msg = get_time_string_gmt_to_kst(datetime)
-    if error:
-        return '', True, msg
+class EventClock:
+    """eventlog 의 epoch 초를 timezone 의 시각 문자열로 바꾼다.
+    eventlog 는 시간 순이라 마지막 초의 문자열을 다시 쓴다."""
 
-    return ','.join([event, level, datetime, description]), False, ""
+    def __init__(self, timezone=KST):
+        self.timezone = timezone
+        self.second = None
+        self.text = ''
+
+    def format(self, timestamp):
+        try:
+            second = math.floor(float(timestamp))
+            if second != self.second:
+                self.text = datetime.datetime.fromtimestamp(second, self.timezone).strftime('%Y-%m-%d %H:%M:%S')
+                self.second = second
+            return self.text
+        except Exception as e:
+            return ''
 
 
 def key_value_coloring(match):
@@ -207,35 +284,57 @@ def key_value_coloring(match):
 def key_word_coloring(match):
     return apply_color(f'{match.group()}', 'keyword')
 
-def parse_eventlog(log):
-    if log.startswith('0x'):
-        log, error, msg = translate(log)
-        if error:
-            return None, True, msg
-    else:
+_color_bytes = {}  # color name -> 미리 encode 한 ansi code, load_colors() 에서 비운다
+
+def apply_color_bytes(data, color_name):
+    ansi_code = _color_bytes.get(color_name)
+    if ansi_code is None:
+        ansi_code = _color_bytes[color_name] = colors.get(color_name, '\033[0m').encode()
+    return ansi_code + data + b'\033[0m'
+
+ERROR_LEVELS_BYTES = (b'severe', b'error', b'fail', b'warning', b'exception', b'except', b'critical')
+
+def apply_level_color_bytes(level):
+    if level.strip(b"[] ").lower() in ERROR_LEVELS_BYTES:
+        return apply_color_bytes(level, 'error')
+    return apply_color_bytes(level, 'level')
+
+def apply_description_color_bytes(description, options):
+    # keyword, key=value 를 칠할 때만 description 을 decode 한다
+    if not options.keyword_coloring and not options.keyvalue_coloring:
+        return apply_color_bytes(description, 'description')
+
+    description = description.decode('utf-8', 'replace')
+    if options.keyword_coloring:
+        description = re.sub(r"\[([^]]+)\]", key_word_coloring, description)
+        description = re.sub(r"\(([^)]+)\)", key_word_coloring, description)
+
+    if options.keyvalue_coloring:
+        description = re.sub(r"[a-zA-Z0-9_\-]+\s?=\s?[a-zA-Z0-9_/@$#%&\.\^\-\[\]]+", key_value_coloring, description)
+
+    return apply_color(description, 'description').encode('utf-8')
+
+def split_eventlog(log):
+    if not log.startswith('0x'):
         return None, True, "Not eventlog format, does not start with '0x'"
 
     try:
-        event, level, datetime, description = log.split(',', 3)
+        event, level, timestamp, description = log.split(',', 3)
     except Exception as e:
         return None, True, str(e)
-        
-    return [event, level, datetime, description], False, ""
+
+    return [event, level, timestamp, description], False, ""
 
 def format_eventlog(log, options):
-    log_parts, error, msg = parse_eventlog(log)
+    log_parts, error, msg = split_eventlog(log)
     if error:
         return log, True, msg
 
-    event, level, datetime, description = log_parts
-        
-    if level.strip("[] ").lower() in ['severe', 'error', 'fail', 'warning', 'exception', 'except', 'critical']:
-        level = apply_color(level,'error')
-    else:
-        level = apply_color(level, 'level')
+    event, level, timestamp, description = log_parts
+    event = render_event_type(event)
+    level = render_event_level(level)
+    datetime = options.event_clock.format(timestamp)
 
-    event = apply_color(event, 'event')
-    
     if options.keyword_coloring:
         description = re.sub(r"\[([^]]+)\]", key_word_coloring, description)
         description = re.sub(r"\(([^)]+)\)", key_word_coloring, description)
@@ -256,6 +355,39 @@ def format_eventlog(log, options):
 
     return '%s %s %s %s' % (datetime, event, level, description), False, ""
 
+@functools.lru_cache(maxsize=256)
+def render_event_type_bytes(event):
+    return render_event_type(event.decode('utf-8', 'replace')).encode('utf-8')
+
+@functools.lru_cache(maxsize=256)
+def render_event_level_bytes(level):
+    return render_event_level(level.decode('utf-8', 'replace')).encode('utf-8')
+
+def format_eventlog_bytes(log, options):
+    if not log.startswith(b'0x'):
+        return log, True, "Not eventlog format, does not start with '0x'"
+
+    try:
+        event, level, timestamp, description = log.split(b',', 3)
+    except Exception as e:
+        return log, True, str(e)
+
+    event = render_event_type_bytes(event)
+    level = render_event_level_bytes(level)
+    datetime = options.event_clock.format(timestamp).encode()
+    description = apply_description_color_bytes(description, options)
+
+    if options.skip_date and options.skip_time:
+        datetime = b""
+
+    if options.skip_level:
+        level = b""
+
+    if options.print_simple_format:
+        return b' '.join((level, datetime, event, description)), False, ""
+
+    return b' '.join((datetime, event, level, description)), False, ""
+
 def parse_cilog(log):
     try:
         name, id, date, time, level, section, code, description = log.split(',', 7)
@@ -319,6 +451,36 @@ def format_cilog(log, options):
 
     return ','.join([name, id, date, time, level, section, code, description]), False, ""
 
+def parse_cilog_bytes(log):
+    log_parts = log.split(b',', 7)
+    if len(log_parts) != 8:
+        return [], True, f"expected 8 fields, got {len(log_parts)}"
+    return log_parts, False, ""
+
+def format_cilog_bytes(log, options):
+    log_parts, error, msg = parse_cilog_bytes(log)
+    if error:
+        return log, True, msg
+
+    name, id, date, time, level, section, code, description = log_parts
+
+    if is_valid_date((date + b' ' + time).decode('latin-1')) == None:
+        return log, True, "Invalid date time format"
+
+    name = b"" if options.skip_name else apply_color_bytes(name, 'name')
+    id = b"" if options.skip_id else apply_color_bytes(id, 'id')
+    date = b"" if options.skip_date else apply_color_bytes(date, 'date')
+    time = b"" if options.skip_time else apply_color_bytes(time, 'time')
+    level = b"" if options.skip_level else apply_level_color_bytes(level)
+    section = b"" if options.skip_section else apply_color_bytes(section, 'section')
+    code = b"" if options.skip_code else apply_color_bytes(code, 'code')
+    description = apply_description_color_bytes(description, options)
+
+    if options.print_simple_format:
+        return b','.join([level, date, time, section, code, description]), False, ""
+
+    return b','.join([name, id, date, time, level, section, code, description]), False, ""
+
 def parse_lgufastlog(log):
     try:
         name, id, channel, date, time, level, section, code, description = log.split(',', 8)
@@ -384,6 +546,37 @@ def format_lgufastlog(log, options):
 
     return ','.join([name, id, channel, date, time, level, section, code, description]), False, ""
 
+def parse_lgufastlog_bytes(log):
+    log_parts = log.split(b',', 8)
+    if len(log_parts) != 9:
+        return [], True, f"expected 9 fields, got {len(log_parts)}"
+    return log_parts, False, ""
+
+def format_lgufastlog_bytes(log, options):
+    log_parts, error, msg = parse_lgufastlog_bytes(log)
+    if error:
+        return log, True, msg
+
+    name, id, channel, date, time, level, section, code, description = log_parts
+
+    if is_valid_date((date + b' ' + time).decode('latin-1')) == None:
+        return log, True, "Invalid date time format"
+
+    name = b"" if options.skip_name else apply_color_bytes(name, 'name')
+    id = b"" if options.skip_id else apply_color_bytes(id, 'id')
+    channel = apply_color_bytes(channel, 'channel')
+    date = b"" if options.skip_date else apply_color_bytes(date, 'date')
+    time = b"" if options.skip_time else apply_color_bytes(time, 'time')
+    level = b"" if options.skip_level else apply_level_color_bytes(level)
+    section = b"" if options.skip_section else apply_color_bytes(section, 'section')
+    code = b"" if options.skip_code else apply_color_bytes(code, 'code')
+    description = apply_description_color_bytes(description, options)
+
+    if options.print_simple_format:
+        return b','.join([level, date, time, section, code, description]), False, ""
+
+    return b','.join([name, id, channel, date, time, level, section, code, description]), False, ""
+
 # "127.0.0.1 - - [01/Jan/2000:00:00:00 +0000] \"GET /index.html HTTP/1.1\" 200 2326 \"-\" \"Mozilla/5.0\""
 #"127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] \"GET /apache_pb.gif HTTP/1.0\" 200 2326 \"http://www.example.com/start.html\" \"Mozilla/4.08 [en] (Win98; I ;Nav)\""
 # IP 주소 (127.0.0.1): 클라이언트의 IP 주소입니다.
@@ -395,11 +588,11 @@ def format_lgufastlog(log, options):
 # 응답 크기 (2326): 서버가 클라이언트에게 전송한 응답의 바이트 크기입니다.
 # 참조 URL ("http://www.example.com/start.html"): 클라이언트가 현재 요청을 하기 전에 마지막으로 방문한 페이지의 URL입니다.
 # 유저 에이전트 ("Mozilla/4.08 [en] (Win98; I ;Nav)"): 클라이언트의 브라우저 및 운영 체제 정보를 나타내는 문자열입니다.
+NCSA_COMBINED_LOG_PATTERN = re.compile(r'^(\S+) (\S+) (\S+) \[(.*?)\] "(.*?)" (\d{3}) (\d+|-) "(.*?)" "(.*?)"$')
+
 def is_ncsa_combined_log(log_line):
-    # 정규 표현식 패턴 정의
-    pattern = re.compile(r'^(\S+) (\S+) (\S+) \[(.*?)\] "(.*?)" (\d{3}) (\d+|-) "(.*?)" "(.*?)"$')
     # 정규 표현식 패턴과 로그 라인 매칭
-    match = pattern.match(log_line)
+    match = NCSA_COMBINED_LOG_PATTERN.match(log_line)
     return match is not None
 
 def is_valid_ip(ip):
@@ -414,7 +607,64 @@ def is_valid_ip(ip):
             return False
     return True
 
+MONTHS = {name: index for index, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+
+# 2024-05-29 13:14:38.123, 2024-05-29 13:14:38,123 (cilog, log4j), 04-Feb-2024 11:54:06.612 (tomcat)
+TIMESTAMP_PATTERN = re.compile(r'\s*(\d{4}-\d{1,2}-\d{1,2}|\d{1,2}-[A-Za-z]{3}-\d{4})[ T](\d{1,2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?\s*')
+# dateutil 이 받아들일 수 있는 문자, 다른 문자가 있으면 dateutil 도 실패한다
+DATEUTIL_CHARS_PATTERN = re.compile(r"[A-Za-z0-9\s.,;:/'+\-]*")
+# 10/Oct/2000:13:55:36 -0700 (NCSA)
+NCSA_TIMESTAMP_PATTERN = re.compile(r'(\d{1,2}/[A-Za-z]{3}/\d{4}):(\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2})(\d{2})')
+
+@functools.lru_cache(maxsize=1024)
+def parse_date_prefix(date):  # -> datetime.date or None
+    """Parse the date part of a timestamp: 2024-05-29, 04-Feb-2024 or 10/Oct/2000.
+    Cached, as consecutive lines share the date."""
+    try:
+        if date[4:5] == '-':
+            year, month, day = date.split('-')
+            return datetime.date(int(year), int(month), int(day))
+        day, month, year = date.replace('/', '-').split('-')
+        return datetime.date(int(year), MONTHS[month.lower()], int(day))
+    except (ValueError, KeyError):
+        return None
+
+def parse_timestamp(date_str):  # -> datetime.datetime or None
+    """Parse the timestamp layouts of our logs without dateutil."""
+    match = TIMESTAMP_PATTERN.fullmatch(date_str)
+    if match is None:
+        return None
+    date = parse_date_prefix(match.group(1))
+    if date is None:
+        return None
+    hour, minute, second, fraction = match.group(2, 3, 4, 5)
+    microsecond = int(fraction.ljust(6, '0')) if fraction else 0
+    try:
+        return datetime.datetime(date.year, date.month, date.day, int(hour), int(minute), int(second), microsecond)
+    except ValueError:
+        return None
+
+def is_valid_date(date_str):
+    date_obj = parse_timestamp(date_str)
+    if date_obj is not None:
+        return date_obj
+    if DATEUTIL_CHARS_PATTERN.fullmatch(date_str) is None:
+        return None
+
+    try:
+        # 다른 형식이면 dateutil 로 문자열을 datetime 객체로 변환
+        return parser.parse(date_str)
+    except (ValueError, OverflowError):
+        return None
+
 def is_valid_ncsa_date(date_str):
+    match = NCSA_TIMESTAMP_PATTERN.fullmatch(date_str)
+    if match is not None and parse_date_prefix(match.group(1)) is not None:
+        hour, minute, second, sign, tz_hour, tz_minute = match.group(2, 3, 4, 5, 6, 7)
+        if int(hour) < 24 and int(minute) < 60 and int(second) < 60 and int(tz_minute) < 60:
+            return True
+
     try:
         datetime.datetime.strptime(date_str, "%d/%b/%Y:%H:%M:%S %z")
         return True
@@ -464,6 +714,45 @@ def format_ncsacombinedlog(log, options):
     return '%s %s %s %s %s %s %s %s' % (host, id, username, datetimetz, request, statuscode, bytes, combined), False, ""
 
 
+def parse_ncsacombinedlog_bytes(log):
+    log_parts = log.split(b' ', 10)
+    if len(log_parts) != 11:
+        return [], True, f"expected 11 fields, got {len(log_parts)}"
+
+    host, id, username, datetime, tz, method, uri, version, statuscode, bytes, combined = log_parts
+    if not is_valid_ip(host.decode('latin-1')):
+        return [], True, "Invalid IP address"
+
+    if not datetime.startswith(b'[') or not tz.endswith(b']'):
+        return [], True, "Invalid datetime format"
+
+    if not is_valid_ncsa_date((datetime + b' ' + tz).strip(b'[]').decode('latin-1')):
+        return [], True, "Invalid date format"
+
+    return log_parts, False, ""
+
+def format_ncsacombinedlog_bytes(log, options):
+    log_parts, error, msg = parse_ncsacombinedlog_bytes(log)
+    if error:
+        return log, True, msg
+
+    host, id, username, datetime, tz, method, uri, version, statuscode, bytes, combined = log_parts
+
+    datetimetz = b""
+    if not (options.skip_date and options.skip_time):
+        datetimetz = apply_color_bytes(datetime + b' ' + tz, 'date')
+    request = apply_color_bytes(method + b" " + uri + b" " + version, 'request')
+    statuscode = apply_color_bytes(statuscode, 'status_code')
+    bytes = apply_color_bytes(bytes, 'number')
+
+    if options.print_simple_format:
+        return b' '.join([datetimetz, request, statuscode, bytes, combined]), False, ""
+
+    host = apply_color_bytes(host, 'ip')
+    id = apply_color_bytes(id, 'id')
+    username = apply_color_bytes(username, 'user_name')
+    return b' '.join([host, id, username, datetimetz, request, statuscode, bytes, combined]), False, ""
+
 # NCSA Common Log Format (CLF)
 # host ident authuser [date] "request" status bytes
 # host: 클라이언트의 IP 주소 또는 호스트 이름.
@@ -484,10 +773,11 @@ def parse_ncsalog(log):
     if not is_valid_ip(host):
         return [], True, "Invalid IP address"
     
+    datetimetz = datetime + ' ' + tz
     if not datetimetz.startswith('[') or not datetimetz.endswith(']'):
         return [], True, "Invalid datetime format"
     
-    date_str = ' '.join(datetimetz).strip('[]')
+    date_str = datetimetz.strip('[]')
     if not is_valid_ncsa_date(date_str):
         return [], True, "Invalid date format"
     
@@ -504,7 +794,7 @@ def format_ncsalog(log, options):
     host = apply_color(host, 'ip')
     id = apply_color(id, 'id')
     username = apply_color(username, 'name')
-    datetimetz = apply_color(datetimetz, 'date')
+    datetimetz = apply_color(datetime + ' ' + tz, 'date')
     request = method + " " + uri + " " + version
     request = apply_color(request, 'request')
     statuscode = apply_color(statuscode, 'status_code')
@@ -576,14 +866,6 @@ def format_simple_log4j(log, options):
 # 15-May-2024 20:20:21.822 정보 [main] org.apache.catalina.core.StandardService.stopInternal 서비스 [Catalina]을(를) 중지시킵니다.
 # 15-May-2024 19:30:17.676 정보 [main] org.apache.catalina.core.AprLifecycleListener.initializeSSL OpenSSL이 성공적으로 초기화되었습니다: [OpenSSL 3.0.11 19 Sep 2023]
 # 04-Feb-2024 11:54:06.612 INFO [localhost-startStop-12] org.apache.catalina.core.ApplicationContext.log Closing Spring root WebApplicationContext
-def is_valid_date(date_str):
-    try:
-        # 문자열을 datetime 객체로 변환
-        date_obj = parser.parse(date_str)
-        return date_obj
-    except ValueError:
-        return None
-
 def parse_tomcat_log(log):
     try:
         date, time, level, section, where, description = log.split(' ', 5)
@@ -706,7 +988,131 @@ def format_simple_trace(log, options):
 
     return log, False, ""
 
-def print_format_log(log, options):
+LOG_FORMATTERS = [
+    (format_eventlog, 'EVENTLOG'),
+    (format_cilog, 'CILOG'),
+    (format_lgufastlog, 'LGUFASTLOG'),
+    (format_ncsacombinedlog, 'NCSACOMBINE'),
+    (format_ncsalog, 'NCSA'),
+    (format_simple_log4j, 'LOG4J'),
+    (format_tomcat_log, 'TOMCAT'),
+    (format_simplelog, 'SIMPLE'),
+    (format_simple_trace, 'TRACE')
+]
+
+# LOG_FORMATTERS 의 index -> 같은 형식을 bytes 로 처리하는 formatter
+BYTES_FORMATTERS = {
+    0: format_eventlog_bytes,
+    1: format_cilog_bytes,
+    2: format_lgufastlog_bytes,
+    3: format_ncsacombinedlog_bytes,
+}
+
+# 각 형식의 formatter 가 받아들이는 줄이 반드시 갖는 모양
+LOG_FORMAT_SHAPES = {
+    'EVENTLOG': r'0x',
+    'CILOG': r'(?:[^,]*,){7}',
+    'LGUFASTLOG': r'(?:[^,]*,){8}',
+    'NCSACOMBINE': r'\d+\.\d+\.\d+\.\d+ [^ ]* [^ ]* \[[^ ]* [^ ]*\] (?:[^ ]* ){5}',
+    'NCSA': r'\d+\.\d+\.\d+\.\d+ [^ ]* [^ ]* \[[^ ]* [^ ]*\] (?:[^ ]* ){4}',
+    'LOG4J': r'[^,]* [^,]*,[^,]*,.*:',
+    'TOMCAT': r'(?:[^ ]* ){5}',
+    'SIMPLE': r'(?:[^ ]* ){4}',
+    'TRACE': r'',
+}
+
+class FormatClassifier:
+    """Pick the formatters of LOG_FORMATTERS worth trying for a line.
+
+    The shapes of all formats are compiled once into one regex of named
+    alternatives in the order of LOG_FORMATTERS, so a single match finds
+    the first format whose shape the line has. Its formatter is tried
+    first; only if it rejects the line (e.g. an invalid date) are the later
+    formats with a matching shape tried."""
+
+    def __init__(self, formatters, binary=False):
+        patterns = [LOG_FORMAT_SHAPES[log_type] for _, log_type in formatters]
+        if binary:
+            patterns = [pattern.encode() for pattern in patterns]
+            alternatives = b'|'.join(b'(?P<f%d>%s)' % (index, pattern) for index, pattern in enumerate(patterns))
+        else:
+            alternatives = '|'.join(f'(?P<f{index}>{pattern})' for index, pattern in enumerate(patterns))
+        self.combined = re.compile(alternatives, re.S)
+        self.shapes = [re.compile(pattern, re.S) for pattern in patterns]
+
+    def indexes(self, log, skip=None):
+        """Yield the indexes of LOG_FORMATTERS to try for log, except skip."""
+        match = self.combined.match(log)
+        if match is None:
+            return
+        first = int(match.lastgroup[1:])
+        if first != skip:
+            yield first
+        for index in range(first + 1, len(self.shapes)):
+            if index != skip and self.shapes[index].match(log):
+                yield index
+
+class FormatDetector:
+    """The format of the lines of one file (or stdin).
+
+    After LOCK_MATCHES consecutive lines formatted by the same formatter of
+    LOG_FORMATTERS, that formatter is locked and tried first, so a line
+    costs one parse. Only when it fails are the others tried in order; a
+    different formatter matching LOCK_MATCHES lines in a row takes over
+    the lock. TRACE accepts any line and is never locked."""
+
+    LOCK_MATCHES = 8
+
+    def __init__(self, name):
+        self.name = name
+        self.locked = None  # LOG_FORMATTERS 의 index
+        self.candidate = None
+        self.matches = 0
+        self.lines = 0
+        self.fallbacks = 0  # lock 된 formatter 가 실패한 줄 수
+        self.lock_changes = 0
+
+    def matched(self, index, options):
+        self.lines += 1
+        if index == self.locked:
+            self.candidate = None
+            self.matches = 0
+            return
+
+        if self.locked is not None:
+            self.fallbacks += 1
+        if index == self.candidate:
+            self.matches += 1
+        else:
+            self.candidate = index
+            self.matches = 1
+
+        if self.matches >= self.LOCK_MATCHES and LOG_FORMATTERS[index][1] != 'TRACE':
+            verbose('Format', f'{self.name}, {LOG_FORMATTERS[index][1]} after {self.matches} lines', options)
+            self.locked = index
+            self.lock_changes += 1
+            self.candidate = None
+            self.matches = 0
+
+_format_detectors = {}  # file name -> FormatDetector
+_text_classifier = FormatClassifier(LOG_FORMATTERS)
+_bytes_classifier = FormatClassifier(LOG_FORMATTERS, binary=True)
+
+def format_indexes(log, classifier, detector=None):
+    # lock 된 formatter 는 모양을 확인하지 않고 먼저 시도한다
+    if detector is None or detector.locked is None:
+        yield from classifier.indexes(log)
+    else:
+        yield detector.locked
+        yield from classifier.indexes(log, detector.locked)
+
+def get_format_detector(name):
+    detector = _format_detectors.get(name)
+    if detector is None:
+        detector = _format_detectors[name] = FormatDetector(name)
+    return detector
+
+def format_log(log, options, detector=None):
 
     def try_format(log, formatter, log_type):
         formatted_log, error, msg = formatter(log, options)
@@ -717,22 +1123,18 @@ def print_format_log(log, options):
 
         return formatted_log, error
 
-    formatters = [
-        (format_eventlog, 'EVENTLOG'),
-        (format_cilog, 'CILOG'),
-        (format_lgufastlog, 'LGUFASTLOG'),
-        (format_ncsacombinedlog, 'NCSACOMBINE'),
-        (format_ncsalog, 'NCSA'),
-        (format_simple_log4j, 'LOG4J'),
-        (format_tomcat_log, 'TOMCAT'),
-        (format_simplelog, 'SIMPLE'),
-        (format_simple_trace, 'TRACE')
-    ]
-
-    for formatter, log_type in formatters:
+    formatted_log = log
+    for index in format_indexes(log, _text_classifier, detector):
+        formatter, log_type = LOG_FORMATTERS[index]
         formatted_log, error = try_format(log, formatter, log_type)
         if not error:
+            if detector is not None:
+                detector.matched(index, options)
             break
+    return formatted_log
+
+def print_format_log(log, options, detector=None):
+    formatted_log = format_log(log, options, detector)
     try:
         print(formatted_log, end=' ')
     except BrokenPipeError:
@@ -740,6 +1142,109 @@ def print_format_log(log, options):
     except Exception:
         exit(1)
 
+def is_bytes_pipeline_usable(encoding, options):
+    """Whether lines of a file in encoding can go through print_format_log_bytes().
+
+    The file and stdout must both be UTF-8 (or ASCII), so the bytes of the
+    fields can be written as they are. --debug messages go through print(),
+    so they keep the str path to stay in order."""
+    if options.debug:
+        return False
+    try:
+        return (codecs.lookup(encoding).name in ('utf-8', 'ascii')
+                and codecs.lookup(sys.stdout.encoding).name == 'utf-8'
+                and hasattr(sys.stdout, 'buffer'))
+    except (LookupError, TypeError):
+        return False
+
+def format_log_bytes(log, options, detector=None):
+    """format_log() for an undecoded UTF-8 line, see print_format_log_bytes()."""
+    text = None
+    for index in format_indexes(log, _bytes_classifier, detector):
+        formatter = BYTES_FORMATTERS.get(index)
+        if formatter is not None:
+            formatted_log, error, msg = formatter(log, options)
+        else:
+            if text is None:
+                text = log.decode('utf-8', 'replace')
+            formatted_log, error, msg = LOG_FORMATTERS[index][0](text, options)
+            if not error:
+                formatted_log = formatted_log.encode('utf-8')
+        if not error:
+            if detector is not None:
+                detector.matched(index, options)
+            return formatted_log
+    return log
+
+def print_format_log_bytes(log, options, detector=None):
+    """print_format_log() for an undecoded UTF-8 line.
+
+    cilog, lgufastlog and NCSA combined logs are split and checked as bytes,
+    only the description is decoded when keywords are colored, and the
+    colored line goes to sys.stdout.buffer. Other lines are decoded once
+    for the rest of LOG_FORMATTERS. Call sys.stdout.flush() before and
+    sys.stdout.buffer.flush() after a run of lines."""
+    sys.stdout.buffer.write(format_log_bytes(log, options, detector) + b' ')
+
+class BinaryVerdictCache:
+    """is_binary() verdicts keyed by (st_dev, st_ino, size bucket, first block crc32).
+
+    The size bucket is the file size up to 4KB, the range is_binary() reads,
+    so a log that only grows past it keeps its verdict. Optionally loaded from
+    and saved to ~/.cache/ctail so restarts do not probe the same files again."""
+
+    MAX_ENTRIES = 100000
+
+    def __init__(self):
+        self.verdicts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.path = None
+
+    def get(self, key):
+        verdict = self.verdicts.get(key)
+        if verdict is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.verdicts.move_to_end(key)
+        return verdict
+
+    def put(self, key, verdict):
+        self.verdicts[key] = verdict
+        self.verdicts.move_to_end(key)
+        while len(self.verdicts) > self.MAX_ENTRIES:
+            self.verdicts.popitem(last=False)
+
+    def load(self, path):
+        self.path = path
+        try:
+            with open(path, encoding='utf-8') as f:
+                for dev, ino, bucket, crc, verdict in json.load(f):
+                    self.verdicts[(dev, ino, bucket, crc)] = verdict
+        except (OSError, ValueError, TypeError):
+            return False
+        return True
+
+    def save(self):
+        if self.path is None:
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump([[*key, verdict] for key, verdict in self.verdicts.items()], f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            return False
+        return True
+
+_binary_verdicts = BinaryVerdictCache()
+
+def get_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ctail')
+
 def is_binary(filename):
     """Return true if the given filename is binary.
     @raise EnvironmentError: if the file does not exist or cannot be accessed.
@@ -749,32 +1254,209 @@ def is_binary(filename):
     with open(filename, 'rb') as f:
         CHUNKSIZE = 1024  # 1KB씩 읽기
         max_bytes_to_read = 4096  # 처음 4KB만 읽기
-        bytes_read = 0
 
+        chunk = f.read(CHUNKSIZE)
+        if b'\0' in chunk:  # found null byte
+            return True
+        if len(chunk) < CHUNKSIZE:
+            return False  # done
+
+        st = os.fstat(f.fileno())
+        key = (st.st_dev, st.st_ino, min(st.st_size, max_bytes_to_read), zlib.crc32(chunk))
+        verdict = _binary_verdicts.get(key)
+        if verdict is not None:
+            return verdict
+
+        verdict = False
+        bytes_read = len(chunk)
         while bytes_read < max_bytes_to_read:
             chunk = f.read(CHUNKSIZE)
             if b'\0' in chunk:  # found null byte
-                return True
+                verdict = True
+                break
             if len(chunk) < CHUNKSIZE:
                 break  # done
-    return False
+            bytes_read += len(chunk)
+
+    _binary_verdicts.put(key, verdict)
+    return verdict
+
+DIRECTORY_RESCAN_INTERVAL = 5.0  # 디렉토리 mtime 이 그대로여도 가끔 전체를 다시 확인
+
+class DirectoryIndex:
+    """Newest text file in a directory, without listing it on every call.
+
+    Entries are keyed by (st_dev, st_ino) and keep the mtime and the
+    is_binary() verdict, which is probed lazily from the newest entry down.
+    The directory is listed again only when its own mtime changes (a file
+    is created, removed or renamed) or, with periodic=True, every
+    DIRECTORY_RESCAN_INTERVAL seconds; otherwise only the current candidate
+    is stat'ed. Names of subdirectories are kept for TreeIndex."""
+
+    def __init__(self, path, name_filter=None):
+        self.path = path
+        self.name_filter = name_filter
+        self.mtime = None
+        self.scanned_at = 0
+        self.entries = {}  # (st_dev, st_ino) -> [file_path, mtime, size, binary]
+        self.candidate = None
+        self.subdirs = []
+
+    def cached_verdict(self, key, file_path, st):
+        entry = self.entries.get(key)
+        # is_binary() 는 처음 4KB 만 읽으므로, 같은 파일이 그 뒤로 커지기만 했다면 이전 판정을 쓴다
+        if entry is not None and entry[0] == file_path and (
+                st.st_size == entry[2] or 4096 <= entry[2] <= st.st_size):
+            return entry[3]
+        return None
 
-def newest_file_in(path):
-    newest_file_name = ""
-    newest_mtime = -1
+    def rescan(self, dir_mtime):
+        # DirEntry.stat() 로 파일 당 stat 한 번, is_binary() 는 mtime 이 가장 큰 후보부터 필요할 때만
+        entries = {}
+        heap = []
+        subdirs = []
+        with os.scandir(self.path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if self.name_filter is not None and not self.name_filter(entry.name):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                key = (st.st_dev, st.st_ino)
+                binary = self.cached_verdict(key, entry.path, st)
+                entries[key] = [entry.path, st.st_mtime, st.st_size, binary]
+                if binary is not True:
+                    heap.append((-st.st_mtime, key))
+
+        self.entries = entries
+        self.subdirs = subdirs
+        self.mtime = dir_mtime
+        self.scanned_at = time.monotonic()
+        self.candidate = None
+
+        heapq.heapify(heap)
+        while heap:
+            _, key = heapq.heappop(heap)
+            entry = entries[key]
+            if entry[3] is None:
+                try:
+                    entry[3] = is_binary(entry[0])
+                except OSError:
+                    continue
+            if not entry[3]:
+                self.candidate = key
+                break
+
+    def refresh_candidate(self):
+        entry = self.entries[self.candidate]
+        try:
+            st = os.stat(entry[0])
+        except OSError:
+            return False
+        if (st.st_dev, st.st_ino) != self.candidate:
+            return False
+        entry[1] = st.st_mtime
+        entry[2] = st.st_size
+        return True
 
-    for f in os.listdir(path):
-        file_path = os.path.join(path, f)
-        if os.path.isfile(file_path):
+    def newest(self, periodic=True):
+        dir_mtime = os.stat(self.path).st_mtime_ns
+        if (dir_mtime != self.mtime
+                or (periodic and time.monotonic() - self.scanned_at >= DIRECTORY_RESCAN_INTERVAL)
+                or (self.candidate is not None and not self.refresh_candidate())):
+            self.rescan(dir_mtime)
+
+        if self.candidate is None:
+            return ""
+        return self.entries[self.candidate][0]
+
+    def inodes(self):
+        return {ino for dev, ino in self.entries}
+
+class TreeIndex:
+    """Newest text file under a directory tree, e.g. /var/log/castis/vod/2015-03/...
+
+    Keeps one DirectoryIndex per directory, so each tick costs a stat per
+    directory; only directories whose mtime changed are listed again. The
+    periodic DIRECTORY_RESCAN_INTERVAL rescan is left to the directory of
+    the newest file."""
+
+    def __init__(self, path, name_filter=None):
+        self.path = path
+        self.name_filter = name_filter
+        self.indexes = {}  # directory -> DirectoryIndex
+        self.newest_directory = None
+
+    def newest(self):
+        newest_file_name = ""
+        newest_directory = None
+        newest_mtime = -1
+        indexes = {}
+        pending = [self.path]
+        while pending:
+            directory = pending.pop()
+            index = self.indexes.get(directory) or DirectoryIndex(directory, self.name_filter)
             try:
-                mtime = os.path.getmtime(file_path)
-                if mtime > newest_mtime and not is_binary(file_path):
-                    newest_mtime = mtime
-                    newest_file_name = file_path
+                file_name = index.newest(periodic=directory == self.newest_directory)
             except OSError:
-                continue
+                continue  # 지워진 디렉토리
+            indexes[directory] = index
+            pending.extend(index.subdirs)
+
+            if file_name and index.entries[index.candidate][1] > newest_mtime:
+                newest_mtime = index.entries[index.candidate][1]
+                newest_file_name = file_name
+                newest_directory = directory
+
+        self.indexes = indexes
+        self.newest_directory = newest_directory
+        return newest_file_name
+
+    def inodes(self):
+        return set().union(*(index.inodes() for index in self.indexes.values()))
+
+_directory_indexes = {}
+
+def newest_file_in(path, name_filter=None, recursive=False):
+    index = _directory_indexes.get((path, name_filter, recursive))
+    if index is None:
+        index_class = TreeIndex if recursive else DirectoryIndex
+        index = _directory_indexes[(path, name_filter, recursive)] = index_class(path, name_filter)
+    return index.newest()
+
+def indexed_inodes(path, name_filter=None, recursive=False):
+    """Inode numbers of the files newest_file_in() last saw under path."""
+    index = _directory_indexes.get((path, name_filter, recursive))
+    if index is None:
+        return set()
+    return index.inodes()
+
+def compile_name_filter(include, exclude):
+    """Compile --include/--exclude patterns into one regex match function.
+
+    Patterns are globs matched against the whole file name, or regular
+    expressions with a "re:" prefix. A name is kept if it matches any
+    include pattern (or there are none) and no exclude pattern."""
+    def translate(pattern):
+        if pattern.startswith('re:'):
+            return f'(?:{pattern[3:]})\\Z'
+        return fnmatch.translate(pattern)
+
+    if not include and not exclude:
+        return None
 
-    return newest_file_name
+    regex = ''
+    if exclude:
+        regex += '(?!' + '|'.join(translate(p) for p in exclude) + ')'
+    if include:
+        regex += '(?:' + '|'.join(translate(p) for p in include) + ')'
+    return re.compile(regex).match
 
 def get_path_of(filename):
     path = os.path.realpath(filename)
@@ -789,10 +1471,111 @@ def exist_directory(directory):
     return os.path.exists(directory)
 
 def cat(options):
+    detector = get_format_detector('-')
     for line in fileinput.input("-"):
-        print_format_log(line, options)
+        print_format_log(line, options, detector)
         sys.stdout.softspace = 0
 
+MMAP_WINDOW_SIZE = 64 * 1024 * 1024
+
+class BulkScan:
+    """Scan a file without pushing other data out of the page cache (--bulk).
+
+    The kernel is told the file is read sequentially, the next window is
+    prefetched, and the pages of a window are dropped with
+    POSIX_FADV_DONTNEED once the scan moves past it. With max_rate (MB/s)
+    the scan sleeps between windows to stay under that rate."""
+
+    WINDOW_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, fd, max_rate=None):
+        self.fd = fd
+        self.max_rate = max_rate * 1024 * 1024 if max_rate else None
+        self.started = time.monotonic()
+        self.scanned = 0  # 이 위치까지 읽고 page cache 에서 버렸다
+        self.advise(0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+    def advise(self, offset, length, advice):
+        if hasattr(os, advice):
+            try:
+                os.posix_fadvise(self.fd, offset, length, getattr(os, advice))
+            except OSError:
+                pass
+
+    def prefetch(self, offset):
+        self.advise(offset, self.WINDOW_SIZE, 'POSIX_FADV_WILLNEED')
+
+    def done(self, pos):
+        """Drop the pages before pos, then wait if the scan is ahead of max_rate."""
+        if pos <= self.scanned:
+            return
+        self.advise(self.scanned, pos - self.scanned, 'POSIX_FADV_DONTNEED')
+        self.scanned = pos
+
+        if self.max_rate:
+            ahead = self.scanned / self.max_rate - (time.monotonic() - self.started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+def iter_mmap_lines(fd, encoding=None, scan=None):
+    """Yield the lines of a file, with their '\\n' ('\\r\\n' becomes '\\n'), through read-only mmap windows.
+
+    Lines are found with mmap.find() and decoded straight from a memoryview
+    of the mapping, or yielded as bytes if encoding is None. Each window of
+    MMAP_WINDOW_SIZE is unmapped once the scan moves past it, so memory use
+    stays flat for multi-GB files. With a BulkScan, windows are
+    BulkScan.WINDOW_SIZE and their pages are dropped after use."""
+    size = os.fstat(fd).st_size
+    pos = 0  # 다음 줄이 시작하는 파일 위치
+    default_window_size = MMAP_WINDOW_SIZE if scan is None else scan.WINDOW_SIZE
+    window_size = default_window_size
+    while pos < size:
+        base = pos - pos % mmap.ALLOCATIONGRANULARITY
+        length = min(window_size, size - base)
+        last_window = base + length == size
+        if scan is not None and not last_window:
+            scan.prefetch(base + length)
+        m = mmap.mmap(fd, length, access=mmap.ACCESS_READ, offset=base)
+        view = memoryview(m)
+        try:
+            if hasattr(m, 'madvise'):
+                m.madvise(mmap.MADV_SEQUENTIAL)
+
+            start = pos - base
+            while True:
+                end = m.find(b'\n', start)
+                if end < 0:
+                    break
+                if end > start and m[end - 1] == 0x0D:
+                    # CRLF 줄은 text mode 로 읽던 것처럼 '\r' 을 뺀다
+                    if encoding is None:
+                        yield view[start:end - 1].tobytes() + b'\n'
+                    else:
+                        yield str(view[start:end - 1], encoding, 'replace') + '\n'
+                elif encoding is None:
+                    yield view[start:end + 1].tobytes()
+                else:
+                    yield str(view[start:end + 1], encoding, 'replace')
+                start = end + 1
+
+            if last_window and start < length:
+                if encoding is None:
+                    yield view[start:].tobytes()
+                else:
+                    yield str(view[start:], encoding, 'replace')
+                start = length
+        finally:
+            view.release()
+            m.close()
+
+        if base + start == pos:
+            window_size *= 2  # 한 줄이 window 보다 길다
+        else:
+            window_size = default_window_size
+        pos = base + start
+        if scan is not None:
+            scan.done(pos if pos >= size else pos - pos % mmap.PAGESIZE)
+
 def cat_file(filename, options):
     target, exist, inode = get_tail_filename(filename, True, options)
     if not exist:
@@ -803,13 +1586,34 @@ def cat_file(filename, options):
     verbose('Open', f'{filename}, detected encoding is {encoding}', options)
     
     try:
-        f = open(filename, 'r', encoding=encoding, errors='replace')
+        codecs.lookup(encoding)
+        fd = os.open(filename, os.O_RDONLY)
     except Exception as e:
         verbose('Open Error', f'{filename}, {e}', options)
         return
 
-    for line in f:
-        print_format_log(line, options)
+    try:
+        scan = None
+        if options.bulk:
+            scan = BulkScan(fd, options.max_rate)
+        detector = get_format_detector(filename)
+        if options.raw:
+            reader = LogReader(fd, encoding)
+            reader.copy_to(sys.stdout.fileno())
+            if scan is not None:
+                scan.done(reader.offset)
+        elif is_bytes_pipeline_usable(encoding, options):
+            sys.stdout.flush()
+            for line in iter_mmap_lines(fd, scan=scan):
+                print_format_log_bytes(line, options, detector)
+            sys.stdout.buffer.flush()
+        else:
+            for line in iter_mmap_lines(fd, encoding, scan):
+                print_format_log(line, options, detector)
+    except BrokenPipeError:
+        exit(1)
+    finally:
+        os.close(fd)
 
     return
 
@@ -837,7 +1641,7 @@ def get_tail_filename(filename, follow_file, options):
             verbose('Info', f'Not found path: {path}', options)
             return None, False, None
         
-        tail_file = newest_file_in(path)
+        tail_file = newest_file_in(path, options.name_filter, options.recursive)
         if tail_file == "":
             verbose('Info', f'No text files in {path}', options)
             return None, False, None
@@ -848,63 +1652,532 @@ def get_tail_filename(filename, follow_file, options):
         verbose('Error', f'{filename}, {e}', options)
         return None, False, None
 
-def keep_tail(f, options):  # -> (offset, error)
-    while True:
-        try:
-            line = f.readline()
-        except Exception as e:
-            verbose('Error', f'{e}', options)
-            f.close()
-            return 0, True
-        if line:
-            print_format_log(line, options)
-            sys.stdout.softspace = 0
+def resolve_byte_order(encoding, fd=None):
+    """Return (encoding, BOM) for reading the file fd from any offset.
+
+    utf-16 and utf-32 become their -le or -be codec by the BOM at the start
+    of the file, as their decoders fail on data that does not start with
+    one; the BOM itself is then skipped by the reader."""
+    name = codecs.lookup(encoding).name
+    if name == 'utf-16':
+        boms = (('-be', codecs.BOM_UTF16_BE), ('-le', codecs.BOM_UTF16_LE))
+    elif name == 'utf-32':
+        boms = (('-be', codecs.BOM_UTF32_BE), ('-le', codecs.BOM_UTF32_LE))
+    else:
+        return encoding, b''
+
+    try:
+        head = os.pread(fd, 4, 0) if fd is not None else b''
+    except OSError:
+        head = b''
+    for suffix, bom in boms:
+        if head.startswith(bom):
+            return name + suffix, bom
+    return name + '-le', b''
+
+def encode_newline(encoding):
+    # 두 번째 encode 에는 BOM 이 붙지 않는다 (utf-8-sig)
+    encoder = codecs.getincrementalencoder(encoding)()
+    encoder.encode('\n')
+    return encoder.encode('\n')
+
+class LogReader:
+    """Read appended lines of a log file in large chunks.
+
+    Chunks of 64KB, growing up to 1MB while the file has more to read, are
+    read with os.read() and split on the encoded '\\n' (b'\\n', or e.g.
+    b'\\n\\x00' at an even offset in UTF-16); an incomplete last line is
+    carried over to the next read. Complete lines are decoded with an
+    incremental decoder. `offset` counts the bytes of complete lines read,
+    so it is always at the start of a line. With start_read_ahead() the
+    chunks are read by a ReadAhead thread; `read_offset` is where it is."""
+
+    MIN_CHUNK_SIZE = 64 * 1024
+    MAX_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, fd, encoding, offset=0, skip_partial_line=False, name=None):
+        self.fd = fd
+        self.name = name
+        self.encoding, self.bom = resolve_byte_order(encoding, fd)
+        self.decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        self.newline = encode_newline(self.encoding)
+        self.offset = offset
+        self.read_offset = offset
+        self.pending = b''
+        self.skip_partial_line = skip_partial_line
+        self.chunk_size = self.MIN_CHUNK_SIZE
+        self.closed = False
+        self.read_ahead = None
+
+    def fileno(self):
+        return self.fd
+
+    def seek(self, offset, whence=0):
+        self.stop_read_ahead()
+        self.offset = self.read_offset = os.lseek(self.fd, offset, whence)
+        self.pending = b''
+        self.decoder.reset()
+        return self.offset
+
+    def close(self):
+        if not self.closed:
+            self.stop_read_ahead()
+            self.closed = True
+            os.close(self.fd)
+
+    def start_read_ahead(self, max_blocks):
+        if self.read_ahead is None:
+            self.read_ahead = ReadAhead(self, max_blocks)
+
+    def stop_read_ahead(self):
+        # 아직 출력하지 않은 block 은 버리고 offset 부터 다시 읽는다
+        if self.read_ahead is not None:
+            self.read_ahead.stop()
+            self.read_ahead = None
+            self.read_offset = os.lseek(self.fd, self.offset, os.SEEK_SET)
+            self.pending = b''
+            self.decoder.reset()
+
+    def read_blocks(self, final=False):
+        """Yield blocks of the complete lines appended since the last call, as bytes.
+        If final, an incomplete last line is yielded as the last block."""
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+        if self.read_ahead is None:
+            for block in self.read_fd_blocks(final):
+                self.offset = self.read_offset
+                yield block
         else:
+            for block, offset in self.read_ahead.take(final):
+                self.offset = offset
+                yield block
+
+    def read_fd_blocks(self, final=False):
+        while True:
+            chunk = os.read(self.fd, self.chunk_size)
+            if len(chunk) == self.chunk_size:
+                self.chunk_size = min(self.chunk_size * 2, self.MAX_CHUNK_SIZE)
+            else:
+                self.chunk_size = self.MIN_CHUNK_SIZE
+            if not chunk:
+                break
+
+            data = self.pending + chunk if self.pending else chunk
+            position = self.read_offset  # data 가 시작하는 file offset
+            start = 0
+            if position == 0 and self.bom and data.startswith(self.bom):
+                start = len(self.bom)
+                self.read_offset += start
+            if self.skip_partial_line:
+                # 파일 중간부터 읽기 시작하면 첫 줄은 잘려 있으므로 버린다
+                start = self.find_line_end(data, position, start)
+                if start == 0:
+                    self.read_offset = position + len(data)
+                    self.pending = b''
+                    continue
+                self.skip_partial_line = False
+                self.read_offset = position + start
+
+            end = self.rfind_line_end(data, position, start)
+            if end <= start:
+                self.pending = data[start:]
+                continue
+
+            self.pending = data[end:]
+            self.read_offset += end - start
+            yield data[start:end]
+
+        if final and self.pending:
+            block = self.pending
+            self.read_offset += len(block)
+            self.pending = b''
+            yield block
+
+    def find_line_end(self, data, position, start=0):
+        """Index just after the first newline in data[start:], or 0.
+        data starts at file offset position; a multi-byte newline only counts
+        at an offset aligned to its size."""
+        newline = self.newline
+        if len(newline) == 1:
+            return data.find(newline, start) + 1
+        index = data.find(newline, start)
+        while index >= 0 and (position + index) % len(newline):
+            index = data.find(newline, index + 1)
+        return index + len(newline) if index >= 0 else 0
+
+    def rfind_line_end(self, data, position, start=0):
+        """Index just after the last newline in data[start:], or 0."""
+        newline = self.newline
+        if len(newline) == 1:
+            return data.rfind(newline, start) + 1
+        index = data.rfind(newline, start)
+        while index >= 0 and (position + index) % len(newline):
+            index = data.rfind(newline, start, index + len(newline) - 1)
+        return index + len(newline) if index >= 0 else 0
+
+    def read_lines(self, final=False):
+        """Yield the complete lines appended since the last call, with their '\\n'
+        ('\\r\\n' becomes '\\n'). If final, also yield an incomplete last line."""
+        for block in self.read_blocks(final):
+            if not block.endswith(self.newline):
+                yield self.decoder.decode(block, final=True)
+                continue
+            text = self.decoder.decode(block)
+            if '\r\n' in text:
+                text = text.replace('\r\n', '\n')  # CRLF 로그
+            lines = text.split('\n')
+            for line in lines[:-1]:
+                yield line + '\n'
+
+    def read_byte_lines(self, final=False):
+        """Same as read_lines(), but the lines are not decoded."""
+        for block in self.read_blocks(final):
+            if b'\r\n' in block:
+                block = block.replace(b'\r\n', b'\n')  # CRLF 로그
+            lines = block.split(b'\n')
+            last = lines.pop()
+            for line in lines:
+                yield line + b'\n'
+            if last:
+                yield last
+
+    def copy_to(self, out_fd):
+        """Copy the bytes appended since the last call to out_fd as they are (--raw)."""
+        if self.closed:
+            raise ValueError('I/O operation on closed file.')
+
+        if self.skip_partial_line:
+            block = os.pread(self.fd, 4096, self.offset)
+            end = self.find_line_end(block, self.offset)
+            if end == 0:
+                self.offset += len(block)
+                return
+            self.skip_partial_line = False
+            self.offset += end
+
+        size = os.fstat(self.fd).st_size
+        if self.offset < size:
+            sys.stdout.flush()  # verbose 메시지가 먼저 나가도록
+        while self.offset < size:
+            copied = copy_file_range_to(out_fd, self.fd, self.offset, size - self.offset)
+            if copied == 0:
+                break
+            self.offset += copied
+
+_read_ahead_stats = {'blocks': 0, 'max_depth': 0, 'full_waits': 0}
+
+class ReadAhead:
+    """Read the chunks of a LogReader in a thread, ahead of formatting (--read-ahead).
+
+    Blocks of complete lines go into a queue of at most max_blocks, so
+    reading a burst overlaps formatting and writing it. A full queue makes
+    the thread wait (backpressure). The thread reads when take() asks for
+    new lines and keeps reading on its own while the file grows; an idle
+    file is not read until the next take()."""
+
+    POLL_INTERVAL = 0.05  # 파일이 커지는 동안 스스로 다시 읽는 간격
+
+    def __init__(self, reader, max_blocks):
+        self.reader = reader
+        self.blocks = queue.Queue(max_blocks)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.requested = 0  # take() 가 요청한 횟수
+        self.final = False
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name='read-ahead', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        timeout = None
+        answered = 0
+        while not self.stopped:
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+            with self.lock:
+                requested, final = self.requested, self.final
+
+            read = False
+            try:
+                for block in self.reader.read_fd_blocks(final and requested > answered):
+                    read = True
+                    if not self.put((block, self.reader.read_offset)):
+                        return
+            except Exception as e:
+                self.put((e, None))
+                return
+
+            if requested > answered:
+                # 요청 시점까지 파일에 있던 줄은 모두 queue 에 넣었다
+                answered = requested
+                if not self.put((None, requested)):
+                    return
+            timeout = self.POLL_INTERVAL if read else None
+
+    def put(self, item):
+        _read_ahead_stats['max_depth'] = max(_read_ahead_stats['max_depth'], self.blocks.qsize())
+        try:
+            self.blocks.put_nowait(item)
+            return True
+        except queue.Full:
+            _read_ahead_stats['full_waits'] += 1
+
+        while not self.stopped:
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def take(self, final=False):
+        """Yield (block, offset after it) until the lines in the file now are all taken."""
+        with self.lock:
+            self.requested += 1
+            requested = self.requested
+            self.final = final
+        self.wakeup.set()
+
+        while True:
+            item, value = self.blocks.get()
+            if item is None:
+                if value >= requested:
+                    return
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                _read_ahead_stats['blocks'] += 1
+                yield item, value
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+        self.thread.join()
+
+_copy_method = None  # copy_file_range_to() 가 처음 성공한 방법
+
+def copy_file_range_to(out_fd, in_fd, offset, count):
+    """Copy count bytes at offset of in_fd to out_fd, without passing them
+    through Python if the kernel allows: sendfile(2), then splice(2) when
+    out_fd is a pipe, then pread/write."""
+    global _copy_method
+    if _copy_method in (None, 'sendfile'):
+        try:
+            copied = os.sendfile(out_fd, in_fd, offset, count)
+            _copy_method = 'sendfile'
+            return copied
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP) or _copy_method is not None:
+                raise
+
+    if _copy_method in (None, 'splice') and hasattr(os, 'splice'):
+        try:
+            copied = os.splice(in_fd, out_fd, count, offset_src=offset)
+            _copy_method = 'splice'
+            return copied
+        except OSError as e:
+            if e.errno not in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP) or _copy_method is not None:
+                raise
+
+    _copy_method = 'write'
+    data = os.pread(in_fd, min(count, LogReader.MAX_CHUNK_SIZE), offset)
+    return os.write(out_fd, data)
+
+# 줄의 첫 level 단어, --catch-up summary 에서 건너뛴 구간을 요약할 때 사용
+CATCH_UP_LEVEL_PATTERN = re.compile(rb'^[^\n]*?\b(severe|error|fail|warning|warn|exception|except|critical|info|debug|trace)\b', re.M | re.I)
+
+def count_skipped_lines(fd, start, end, levels=False):  # -> (lines, {level: count})
+    lines = 0
+    level_counts = {}
+    pos = start
+    while pos < end:
+        chunk = os.pread(fd, min(LogReader.MAX_CHUNK_SIZE, end - pos), pos)
+        if not chunk:
             break
-    offset = f.tell()
-    return offset, False
+        if pos + len(chunk) < end:
+            # level 을 셀 때 줄이 chunk 사이에서 잘리지 않도록 마지막 줄바꿈까지만
+            cut = chunk.rfind(b'\n') + 1
+            if cut > 0:
+                chunk = chunk[:cut]
+        pos += len(chunk)
+        lines += chunk.count(b'\n')
+        if levels:
+            for level in CATCH_UP_LEVEL_PATTERN.findall(chunk):
+                level = level.decode('ascii').upper()
+                level_counts[level] = level_counts.get(level, 0) + 1
+    return lines, level_counts
+
+def catch_up(f, options):  # -> step of lines to print
+    """Keep up with a file that grew by more than --catch-up-threshold since the last read.
+
+    skip: jump to the last N lines (-n, default 10), printing how much was
+    skipped; summary: the same, with the number of lines per level in the
+    skipped part; sample: print every --sample-every line of this read."""
+    size = os.fstat(f.fileno()).st_size
+    behind = size - f.offset
+    if behind <= options.catch_up_threshold * 1024 * 1024:
+        return 1
+
+    if options.catch_up == 'sample':
+        print_verbose('>>> {:.1f} MB behind, printing every {}th line'.format(behind / 1024 / 1024, options.sample_every))
+        return options.sample_every
+
+    start = f.offset
+    end = find_last_lines_offset(f.fileno(), size, 10 if options.lines is None else options.lines)
+    if end <= start:
+        return 1
+    lines, level_counts = count_skipped_lines(f.fileno(), start, end, options.catch_up == 'summary')
+    f.seek(end)
+    f.skip_partial_line = False
+
+    message = '>>> skipped {:.1f} MB / {:,} lines'.format((end - start) / 1024 / 1024, lines)
+    if level_counts:
+        message += ': ' + ', '.join(f'{level} {count:,}' for level, count in sorted(level_counts.items(), key=lambda item: -item[1]))
+    print_verbose(message)
+    return 1
+
+def keep_tail(f, options, final=False):  # -> (offset, error)
+    try:
+        if options.raw:
+            f.copy_to(sys.stdout.fileno())
+            return f.offset, False
+
+        step = 1
+        if options.catch_up:
+            step = catch_up(f, options)
+        if options.read_ahead:
+            f.start_read_ahead(options.read_ahead)
+        detector = get_format_detector(f.name)
+        if is_bytes_pipeline_usable(f.encoding, options):
+            sys.stdout.flush()  # verbose 메시지가 먼저 나가도록
+            lines = f.read_byte_lines(final)
+            if step > 1:
+                lines = itertools.islice(lines, 0, None, step)
+            for line in lines:
+                print_format_log_bytes(line, options, detector)
+            sys.stdout.buffer.flush()
+        else:
+            lines = f.read_lines(final)
+            if step > 1:
+                lines = itertools.islice(lines, 0, None, step)
+            for line in lines:
+                print_format_log(line, options, detector)
+    except BrokenPipeError:
+        exit(1)
+    except Exception as e:
+        verbose('Error', f'{e}', options)
+        f.close()
+        return 0, True
+    return f.offset, False
+
+_inode_encodings = {}  # (st_dev, st_ino) -> encoding
+_family_encodings = {}  # (directory, file name without digits) -> encoding
+
+def get_file_family(file_path):
+    # cbank.log.2024-05-29-13 과 cbank.log.2024-05-29-14 는 같은 family
+    return os.path.dirname(file_path), re.sub(r'\d+', '#', os.path.basename(file_path))
 
 def detect_file_encoding(file_path):
+    """Return the encoding of file_path.
+
+    Cached per (st_dev, st_ino). Otherwise the first block is decoded as
+    strict UTF-8; if that fails, the encoding of a file of the same family
+    (rotated files differ only in digits) is reused, and chardet, imported
+    only then, is the last resort."""
     CHUNKSIZE = 1024
     with open(file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        encoding = _inode_encodings.get((st.st_dev, st.st_ino))
+        if encoding is not None:
+            return encoding
         rawdata = f.read(CHUNKSIZE)
-    result = chardet.detect(rawdata)
-    encoding = result['encoding']
-    confidence = result.get('confidence', 0)
-    if encoding is None or encoding.lower() == 'ascii' or    confidence < 0.9:
+
+    family = get_file_family(file_path)
+    try:
+        # 마지막 글자가 잘렸을 수 있으므로 final=False
+        codecs.getincrementaldecoder('utf-8')('strict').decode(rawdata, final=False)
         encoding = 'utf-8'
+    except UnicodeDecodeError:
+        encoding = _family_encodings.get(family)
+        if encoding is None:
+            import chardet
+            result = chardet.detect(rawdata)
+            encoding = result['encoding']
+            confidence = result.get('confidence', 0)
+            if encoding is None or encoding.lower() == 'ascii' or    confidence < 0.9:
+                encoding = 'utf-8'
+
+    _inode_encodings[(st.st_dev, st.st_ino)] = encoding
+    if encoding != 'utf-8':
+        _family_encodings[family] = encoding
     return encoding
 
-def open_tail(filename, options, offset=0):
+def find_last_lines_offset(fd, size, lines, block_size=64 * 1024):
+    """Return the offset where the last `lines` lines of the file start,
+    reading block_size blocks backwards from the end."""
+    if lines <= 0:
+        return size
+
+    end = size
+    # 마지막 줄 끝의 줄바꿈은 세지 않는다
+    if size > 0 and os.pread(fd, 1, size - 1) == b'\n':
+        end -= 1
+
+    count = 0
+    pos = end
+    while pos > 0:
+        read_size = min(block_size, pos)
+        pos -= read_size
+        block = os.pread(fd, read_size, pos)
+        index = len(block)
+        while True:
+            index = block.rfind(b'\n', 0, index)
+            if index < 0:
+                break
+            count += 1
+            if count == lines:
+                return pos + index + 1
+    return 0
+
+def open_tail(filename, options, offset=0, from_start=False):
     encoding = detect_file_encoding(filename)
     verbose('Open', f'{filename}, detected encoding is {encoding}', options)
     try:
-        f = open(filename, 'r', encoding=encoding, errors='replace')
-    except Exception:
-        # 인코딩 감지 실패 시 utf-8로 재시도
-        f = open(filename, 'r', encoding='utf-8', errors='replace')
+        codecs.lookup(encoding)
+    except LookupError:
+        # 인코딩 감지 실패 시 utf-8 사용
+        encoding = 'utf-8'
+
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except Exception as e:
         verbose('Open Error', f'{filename}, {e}', options)
         return None, True
     try:
-        size = os.path.getsize(filename)
+        size = os.fstat(fd).st_size
         if options.follow_file:
             verbose('Open', '{}, size: {:,}'.format(filename, size), options)
         else:
             path = get_path_of(filename)
             verbose('Open','{} in {}, size: {:,}'.format(filename, path, size), options)
 
+        skip_partial_line = False
         if offset > 0:
-            f.seek(offset, 0)
-        else:
-            if size > 2048:
-                f.seek(size - 2048 - 1, 0)
-                f.readline()
+            os.lseek(fd, offset, os.SEEK_SET)
+        elif from_start:
+            pass
+        elif options.lines is not None:
+            offset = os.lseek(fd, find_last_lines_offset(fd, size, options.lines), os.SEEK_SET)
+        elif size > 2048:
+            offset = os.lseek(fd, size - 2048 - 1, os.SEEK_SET)
+            skip_partial_line = True
     except Exception as e:
-        f.close()
+        os.close(fd)
         verbose('Error', f'{filename}, {e}', options)
 
         return None, True
-    return f, False
+    return LogReader(fd, encoding, offset, skip_partial_line, filename), False
 
 
 def is_inode_changed(file, inode, options):
@@ -918,6 +2191,186 @@ def is_inode_changed(file, inode, options):
 
         return None, True
 
+# inotify(7) event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+class Backoff:
+    """Interval between checks of a tailed file.
+
+    Right after data arrives the next check is immediate; while the file
+    stays idle the interval doubles from min_interval up to max_interval.
+    One object is shared by every loop that waits for a file (tail, the
+    rotated file drain and --retry)."""
+
+    MIN_INTERVAL = 0.01
+
+    def __init__(self, max_interval=1.0):
+        self.min_interval = min(self.MIN_INTERVAL, max_interval)
+        self.max_interval = max_interval
+        self.interval = 0
+
+    def reset(self):
+        self.interval = 0
+
+    def next(self):
+        interval = self.interval
+        self.interval = min(max(interval * 2, self.min_interval), self.max_interval)
+        return interval
+
+class PollWatcher:
+    def watch(self, target):
+        return True
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    FILE_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVE_SELF | IN_DELETE_SELF
+    DIR_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE
+
+    def __init__(self, libc, fd, filename, options):
+        self.libc = libc
+        self.fd = fd
+        self.options = options
+        self.directory = None if options.follow_file else get_path_of(filename)
+        self.paths = None
+        self.watches = {}  # path -> watch descriptor
+        self.polling = False
+
+    def add_watch(self, path, mask):  # -> errno, 0 on success
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            return ctypes.get_errno()
+        self.watches[path] = wd
+        return 0
+
+    def watch(self, target):
+        if self.options.follow_file:
+            paths = {target: self.FILE_MASK, os.path.dirname(target): self.DIR_MASK}
+        else:
+            # -R 이면 대상 파일이 하위 디렉토리에 있을 수 있음
+            paths = {target: self.FILE_MASK, os.path.dirname(target): self.DIR_MASK | IN_MODIFY,
+                     self.directory: self.DIR_MASK | IN_MODIFY}
+
+        if paths == self.paths:
+            return not self.polling
+        self.paths = paths
+
+        old_watches = self.watches
+        self.watches = {}
+        self.polling = False
+        for path, mask in paths.items():
+            e = self.add_watch(path, mask)
+            if e == 0:
+                continue
+            if e == errno.ENOENT and path == target and self.options.keep_open:
+                # 이름이 바뀌거나 지워진 파일은 열려 있는 inode 의 watch 로 계속 보고,
+                # 같은 경로에 새 파일이 생길 때까지 다음 watch() 에서 다시 등록한다
+                if target in old_watches:
+                    self.watches[target] = old_watches[target]
+                self.paths = None
+                continue
+            verbose('Watch Error', f'{path}, {os.strerror(e)}, fall back to polling', self.options)
+            self.polling = True
+
+        for wd in set(old_watches.values()) - set(self.watches.values()):
+            # 이미 지워진 파일의 watch 는 커널이 제거하므로 실패해도 무시
+            self.libc.inotify_rm_watch(self.fd, wd)
+        return not self.polling
+
+    def wait(self, timeout):
+        if self.polling:
+            time.sleep(timeout)
+            return
+
+        # 이벤트가 오면 바로 깨어나고, timeout 은 이벤트가 없을 때의 안전장치
+        try:
+            readable, _, _ = select.select([self.fd], [], [], timeout)
+        except InterruptedError:
+            return
+        if not readable:
+            return
+
+        # 이벤트 종류와 상관없이 깨어난 뒤 파일 상태를 다시 확인한다
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not buf:
+                break
+            self.read_events(buf)
+
+    def read_events(self, buf):
+        # struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+        pos = 0
+        while pos + 16 <= len(buf):
+            wd, mask, cookie, length = struct.unpack_from('iIII', buf, pos)
+            pos += 16 + length
+            if mask & (IN_MOVE_SELF | IN_DELETE_SELF):
+                # 같은 경로에 새 파일이 생길 수 있으므로 다음 watch() 에서 다시 등록한다
+                self.paths = None
+            if mask & IN_IGNORED:
+                # 지워진 파일의 watch 는 커널이 제거한다
+                for path, path_wd in list(self.watches.items()):
+                    if path_wd == wd:
+                        del self.watches[path]
+                        self.paths = None
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(filename, options):
+    if options.poll:
+        verbose('Watch', 'polling', options)
+        return PollWatcher()
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError) as e:
+        verbose('Watch', f'inotify is not available, {e}, polling', options)
+        return PollWatcher()
+
+    if fd < 0:
+        verbose('Watch', f'inotify_init1 failed, {os.strerror(ctypes.get_errno())}, polling', options)
+        return PollWatcher()
+
+    verbose('Watch', 'inotify', options)
+    return InotifyWatcher(libc, fd, filename, options)
+
+class TailState:
+    """The file being tailed, and the rotated one while it is drained.
+
+    When the followed path gets a new inode (rename rotation), the old file
+    stays open in `f` and is read to EOF until it stops growing for one
+    tick; only then the new file is opened from its start."""
+
+    def __init__(self, f, target, inode):
+        self.f = f
+        self.target = target
+        self.inode = inode
+        self.offset = 0
+        self.rotated_size = None  # 회전된(이전) 파일을 읽고 있으면 그 파일의 크기
+        self.scanned_at = time.monotonic()
+        self.name_template = None  # (target, strftime template) for --rollover
+        self.size = None
+        self.resolved_at = time.monotonic()  # 경로로 대상 파일을 마지막으로 다시 확인한 시각
+        self.orphaned = False  # -F: 경로에 파일이 없어도 열려 있는 파일을 계속 읽는 중
+        self.known_inodes = set()  # 디렉토리 모드: tail 을 시작할 때 이미 있던 파일들
+
 def tail(filename, options):
     follow_file = options.follow_file
     target, exist, inode = get_tail_filename(filename, follow_file, options)
@@ -929,69 +2382,237 @@ def tail(filename, options):
         return
     options.last_target_filename = target
 
-    while True:
-        offset, error = keep_tail(f, options)
-        if error:
-            clean_up(inode, f, 0)
-            return
-
-        if follow_file:
-            if handle_follow_file(f, target, inode, offset, options) is False:
-                return
-        else:
-            if handle_non_follow_file(f, filename, target, inode, offset, options) is False:
+    state = TailState(f, target, inode)
+    if not follow_file:
+        state.known_inodes = indexed_inodes(get_path_of(filename), options.name_filter, options.recursive)
+    backoff = options.backoff
+    watcher = create_watcher(filename, options)
+    interval = 0
+    try:
+        while True:
+            position = (state.target, state.offset)
+            if tail_once(state, filename, options) is False:
                 return
 
-        time.sleep(0.1)
+            if position != (state.target, state.offset):
+                if interval == backoff.max_interval:
+                    verbose('Interval', f'0 sec, {state.target} is active', options)
+                backoff.reset()
+            previous_interval, interval = interval, backoff.next()
+            if interval == backoff.max_interval and previous_interval != interval:
+                verbose('Interval', f'{interval} sec, {state.target} is idle', options)
+
+            if state.rotated_size is not None:
+                # 이전 파일은 watch 대상이 아니므로 다 읽을 때까지 polling
+                time.sleep(interval)
+                continue
+            watcher.watch(state.target)
+            watcher.wait(interval)
+    finally:
+        watcher.close()
+
+def tail_once(state, filename, options):
+    state.offset, error = keep_tail(state.f, options)
+    if error:
+        clean_up(state.inode, state.f, 0)
+        return False
+
+    if options.follow_file:
+        return handle_follow_file(state, options)
+    return handle_non_follow_file(state, filename, options)
 
 def clean_up(inode, file_obj, offset):
     put_offset(str(inode), offset)
-    file_obj.close()
+    if file_obj is not None:
+        file_obj.close()
+
+RESOLVE_STALL_THRESHOLD = 1.0  # 파일 크기가 이 시간 동안 그대로면 경로를 다시 확인
+
+def is_resolve_needed(state, options):
+    """Check the open file with one fstat() instead of resolving its path.
+
+    The path (or directory) only needs to be looked at again when the file
+    was unlinked, or has not grown for RESOLVE_STALL_THRESHOLD seconds, as
+    the writer moved on to another file. A size below the read offset
+    (copytruncate) restarts reading from 0."""
+    try:
+        st = os.fstat(state.f.fileno())
+    except (OSError, ValueError):
+        return True
+
+    now = time.monotonic()
+    if st.st_size != state.size:
+        state.size = st.st_size
+        state.resolved_at = now
+
+    if st.st_size < state.offset:
+        verbose('Truncated', '{}, size: {:,} < offset: {:,}'.format(state.target, st.st_size, state.offset), options)
+        state.f.seek(0, 0)
+        state.offset = 0
+
+    if st.st_nlink == 0 or now - state.resolved_at >= RESOLVE_STALL_THRESHOLD:
+        state.resolved_at = now
+        return True
+    return False
+
+def switch_tail(state, new_target, new_inode, options, from_start=False, new_file=False):
+    # 이전 파일의 줄바꿈 없이 끝난 마지막 줄까지 출력
+    keep_tail(state.f, options, final=True)
+    clean_up(state.inode, state.f, state.offset)
 
-def handle_follow_file(f, target, inode, offset, options):
-    is_changed, error = is_inode_changed(target, inode, options)
+    # tail 하는 동안 새로 생긴 파일은 읽던 위치가 없으면 마지막 2KB 가 아니라 처음부터 읽는다
+    offset = 0 if from_start else get_offset(str(new_inode))
+    f, error = open_tail(new_target, options, offset, from_start or new_file)
     if error:
-        clean_up(inode, f, 0)
+        clean_up(new_inode, None, 0)
         return False
 
-    if not is_changed:
+    state.f = f
+    state.target = new_target
+    state.inode = new_inode
+    state.offset = offset
+    state.rotated_size = None
+    state.size = None
+    state.resolved_at = time.monotonic()
+    state.orphaned = False
+    options.last_target_filename = new_target
+    return None
+
+def handle_follow_file(state, options):
+    if state.rotated_size is not None:
+        size = os.fstat(state.f.fileno()).st_size
+        if size != state.rotated_size:
+            state.rotated_size = size
+            return None
+
+        new_target, exist, new_inode = get_tail_filename(state.target, True, options)
+        if not exist and options.keep_open:
+            # 새 파일이 다시 사라졌거나 text 파일이 아니면 열려 있는 파일을 계속 읽는다
+            state.rotated_size = None
+            return None
+        if not exist:
+            clean_up(state.inode, state.f, state.offset)
+            return False
+        verbose('Rotated', '{}, read {:,} bytes from the previous file'.format(state.target, state.offset), options)
+        return switch_tail(state, new_target, new_inode, options, from_start=True)
+
+    if not is_resolve_needed(state, options):
         return None
 
-    new_target, exist, new_inode = get_tail_filename(target, True, options)
-    if not exist:
-        clean_up(inode, f, offset)
+    if options.keep_open and not exist_file(state.target):
+        if not state.orphaned:
+            state.orphaned = True
+            verbose('Orphaned', f'{state.target} was renamed or deleted, keep reading the open file until a new one is created', options)
+        return None
+
+    is_changed, error = is_inode_changed(state.target, state.inode, options)
+    if error:
+        clean_up(state.inode, state.f, 0)
         return False
 
-    if inode != new_inode:
-        clean_up(inode, f, offset)
+    if not is_changed:
+        return None
+
+    # 이름이 바뀐 이전 파일에 남은 로그를 끝까지 읽은 뒤에 새 파일로 넘어간다
+    state.rotated_size = os.fstat(state.f.fileno()).st_size
+    return None
 
-        inode = new_inode
-        offset = get_offset(str(inode))
-        f, error = open_tail(new_target, options, offset)
-        if error:
-            clean_up(inode, f, 0)
-            return False
-        options.last_target_filename = new_target
+# cbank.log.2024-05-29-13 처럼 파일 이름에 들어가는 날짜 형식
+NAME_TEMPLATES = [
+    (r'\d{4}-\d{2}-\d{2}-\d{2}', '%Y-%m-%d-%H'),
+    (r'\d{4}-\d{2}-\d{2}', '%Y-%m-%d'),
+    (r'\d{10}', '%Y%m%d%H'),
+    (r'\d{8}', '%Y%m%d'),
+    (r'\d{4}-\d{2}', '%Y-%m'),
+]
+
+ROLLOVER_RESCAN_INTERVAL = 60.0  # --rollover 사용 시에도 가끔 디렉토리 전체를 확인
+
+def learn_name_template(filename):
+    name = os.path.basename(filename)
+    for regex, fmt in NAME_TEMPLATES:
+        for match in reversed(list(re.finditer(regex, name))):
+            try:
+                datetime.datetime.strptime(match.group(), fmt)
+            except ValueError:
+                continue
+            return name[:match.start()].replace('%', '%%') + fmt + name[match.end():].replace('%', '%%')
     return None
 
-def handle_non_follow_file(f, filename, target, inode, offset, options):
-    new_target, exist, new_inode = get_tail_filename(filename, False, options)
+def next_rollover_names(template, filename, now=None):
+    """Return the file names that follow filename according to template:
+    the next period (hour, day or month) and the current period by the clock,
+    in case no log was written for a while."""
+    try:
+        current = datetime.datetime.strptime(os.path.basename(filename), template)
+    except ValueError:
+        return []
+
+    if '%H' in template:
+        next_period = current + datetime.timedelta(hours=1)
+    elif '%d' in template:
+        next_period = current + datetime.timedelta(days=1)
+    elif current.month == 12:
+        next_period = current.replace(year=current.year + 1, month=1)
+    else:
+        next_period = current.replace(month=current.month + 1)
+
+    now = now or datetime.datetime.now()
+    names = []
+    for period in (next_period, now):
+        if period <= current:
+            continue
+        name = period.strftime(template)
+        if name not in names:
+            names.append(name)
+    return names
+
+def predict_tail_filename(state, options):
+    """Like get_tail_filename(), but only stat the file names that are expected next."""
+    if state.name_template is None or state.name_template[0] != state.target:
+        template = options.rollover
+        if template == 'auto':
+            template = learn_name_template(state.target)
+            verbose('Rollover', f'{state.target}, name template: {template}', options)
+        state.name_template = (state.target, template)
+
+    template = state.name_template[1]
+    if template is None:
+        return None, False, None
+
+    directory = os.path.dirname(state.target)
+    for name in next_rollover_names(template, state.target):
+        next_target = os.path.join(directory, name)
+        if os.path.exists(next_target):
+            return get_tail_filename(next_target, True, options)
+
+    return state.target, True, state.inode
+
+def handle_non_follow_file(state, filename, options):
+    if not is_resolve_needed(state, options):
+        return None
+
+    exist = predicted = False
+    if options.rollover is not None and time.monotonic() - state.scanned_at < ROLLOVER_RESCAN_INTERVAL:
+        new_target, exist, new_inode = predict_tail_filename(state, options)
+        predicted = exist
+    if not exist:
+        new_target, exist, new_inode = get_tail_filename(filename, False, options)
+        state.scanned_at = time.monotonic()
     if not exist:
-        clean_up(inode, f, offset)
+        clean_up(state.inode, state.f, state.offset)
         return False
 
-    if target != new_target:
-        clean_up(inode, f, offset)
+    if state.target == new_target and state.inode == new_inode:
+        return None
 
-        target = new_target
-        inode = new_inode
-        offset = get_offset(str(inode))
-        f, error = open_tail(target, options, offset)
-        if error:
-            clean_up(inode, f, 0)
-            return False
-        options.last_target_filename = target
-    return None
+    # 새 파일로 넘어가기 전에 이전 파일에 남은 로그를 읽는다
+    state.offset, error = keep_tail(state.f, options)
+    if error:
+        clean_up(state.inode, state.f, 0)
+        return False
+    new_file = predicted or new_inode not in state.known_inodes
+    return switch_tail(state, new_target, new_inode, options, from_start=state.target == new_target, new_file=new_file)
 
 
 class Handler:
@@ -1008,6 +2629,13 @@ class Handler:
             path = get_path_of(self.options.last_target_filename)
             verbose('Last Open', f'{self.options.last_target_filename} in {path}', self.options)
 
+        verbose('Interval', f'{self.options.backoff.interval} sec', self.options)
+        verbose('Binary Cache', f'hits: {_binary_verdicts.hits:,}, misses: {_binary_verdicts.misses:,}', self.options)
+        for detector in _format_detectors.values():
+            log_type = 'none' if detector.locked is None else LOG_FORMATTERS[detector.locked][1]
+            verbose('Format', f'{detector.name}, {log_type}, lines: {detector.lines:,}, fallbacks: {detector.fallbacks:,}, lock changes: {detector.lock_changes:,}', self.options)
+        if self.options.read_ahead:
+            verbose('Read Ahead', 'blocks: {blocks:,}, max queue depth: {max_depth:,}, waits on a full queue: {full_waits:,}'.format(**_read_ahead_stats), self.options)
         sys.exit(0)
 
 def print_version():
@@ -1019,6 +2647,11 @@ def get_parser():
     parser.add_argument('filename', nargs='?', default='.', help='file to process, or directory to process, default: .')
     parser.add_argument('-v', '--verbose', action='store_true', help='enable verbose output')
     parser.add_argument('-f', '--follow', action='store_true', help='follow a file')
+    parser.add_argument('-F', '--follow-keep-open', action='store_true', help='like -f, but keep reading the open file after it is renamed or deleted, until a new file is created at its path')
+    parser.add_argument('-n', '--lines', type=int, metavar='N', help='print the last N lines first, default: the lines in the last 2KB')
+    parser.add_argument('--catch-up', choices=['skip', 'sample', 'summary'], help='when the file grew by more than --catch-up-threshold since the last read, skip to the last N lines (-n, default 10), print every --sample-every line, or skip and print the number of lines per level')
+    parser.add_argument('--catch-up-threshold', type=float, default=16, metavar='MB', help='size of unread log that starts --catch-up, default: 16')
+    parser.add_argument('--sample-every', type=int, default=100, metavar='K', help='with --catch-up sample, print one of K lines, default: 100')
     parser.add_argument('-r', '--retry', action='store_true', help='retry on failure')
     parser.add_argument('-N', '--skip-name', action='store_true', help='skip name field when printing log')
     parser.add_argument('-I', '--skip-id', action='store_true', help='skip ID field when printing log')
@@ -1027,19 +2660,39 @@ def get_parser():
     parser.add_argument('-L', '--skip-level', action='store_true', help='skip level field when printing log')
     parser.add_argument('-S', '--skip-section', action='store_true', help='skip section field when printing log')
     parser.add_argument('-C', '--skip-code', action='store_true', help='skip code field when printing log')
+    parser.add_argument('--timezone', type=parse_timezone, default=KST, metavar='TZ', help='timezone of eventlog times, e.g. UTC, +09:00, Asia/Seoul, default: +09:00 (KST)')
     parser.add_argument('--simple', action='store_true', help='print in simple format, other than original format')
     parser.add_argument('--cat', action='store_true', help='enable cat mode, print log and exit')
+    parser.add_argument('--bulk', action='store_true', help='with --cat, drop the pages of the file from the page cache once printed, for scanning archives on a live server')
+    parser.add_argument('--max-rate', type=float, metavar='MB', help='with --cat, read at most MB megabytes per second, implies --bulk')
+    parser.add_argument('--raw', action='store_true', help='copy the log to stdout as it is, without parsing or coloring, e.g. when piping to other tools')
     parser.add_argument('--debug', action='store_true', help='enable debug message')
     parser.add_argument('--keyword', action='store_true', help='enable [keyword], (keyword) coloring')
     parser.add_argument('--keyvalue', action='store_true', help='enable key=value coloring')
     parser.add_argument('--version', action='store_true', help='print version information and exit')
     parser.add_argument('--colors-file', type=str, help='use specified colors config file for coloring')
+    parser.add_argument('-R', '--recursive', action='store_true', help='tail the newest text file under the directory and its subdirectories')
+    parser.add_argument('--rollover', action='store_true', help='in directory mode, only check the next file name by the date in the file name (e.g. cbank.log.2024-05-29-13) instead of listing the directory')
+    parser.add_argument('--name-template', metavar='TEMPLATE', help='strftime template of file names for --rollover, e.g. "cbank.log.%%Y-%%m-%%d-%%H", learned from the file name if omitted')
+    parser.add_argument('--include', action='append', metavar='PATTERN', help='in directory mode, only consider file names matching the glob PATTERN ("re:" prefix for a regex), can be repeated')
+    parser.add_argument('--exclude', action='append', metavar='PATTERN', help='in directory mode, skip file names matching the glob PATTERN ("re:" prefix for a regex), e.g. "*.gz", can be repeated')
+    parser.add_argument('--binary-cache', action='store_true', help='remember text/binary checks of files in ~/.cache/ctail across runs')
+    parser.add_argument('--read-ahead', type=int, metavar='BLOCKS', help='read the file in a background thread, up to BLOCKS chunks (64KB-1MB each) ahead of printing')
+    parser.add_argument('--poll', action='store_true', help='check file changes by polling instead of inotify (e.g. NFS)')
+    parser.add_argument('--max-interval', type=float, default=1.0, metavar='SEC', help='maximum interval between checks of an idle file, also between retries, default: 1.0')
 
     return parser
 
 def set_options(args, options):
     options.verbose = args.verbose
-    options.follow_file = args.follow
+    options.follow_file = args.follow or args.follow_keep_open
+    options.keep_open = args.follow_keep_open
+    options.lines = args.lines
+    options.catch_up = args.catch_up
+    options.catch_up_threshold = args.catch_up_threshold
+    options.sample_every = max(args.sample_every, 1)
+    options.raw = args.raw
+    options.read_ahead = args.read_ahead
     options.retry = args.retry
     options.skip_name = args.skip_name
     options.skip_id = args.skip_id
@@ -1049,11 +2702,23 @@ def set_options(args, options):
     options.skip_section = args.skip_section
     options.skip_code = args.skip_code
     options.print_simple_format = args.simple
+    options.event_clock = EventClock(args.timezone)
     options.cat = args.cat
+    options.bulk = args.bulk or args.max_rate is not None
+    options.max_rate = args.max_rate
     options.debug = args.debug
     options.keyword_coloring = args.keyword
     options.keyvalue_coloring = args.keyvalue
     options.colors_file = args.colors_file    
+    options.poll = args.poll
+    options.backoff = Backoff(args.max_interval)
+    options.binary_cache = args.binary_cache
+    options.name_filter = compile_name_filter(args.include, args.exclude)
+    options.recursive = args.recursive
+    if args.name_template is not None:
+        options.rollover = args.name_template
+    elif args.rollover:
+        options.rollover = 'auto'
     
     if options.colors_file is not None:
         options.colors = True
@@ -1077,6 +2742,9 @@ def load_colors(options):
     # convert to colors dictionary
     global colors
     set_256_colors()
+    _color_bytes.clear()
+    for render in (render_event_type, render_event_level, render_event_type_bytes, render_event_level_bytes):
+        render.cache_clear()
     
     for key, value in config_colors.items():
         colors[key] = ansi_colors.get(value, '\033[0m')
@@ -1110,16 +2778,24 @@ def main():
 
     filename = args.filename
 
-    if options.cat:
-        cat_file(filename, options)
-        return
+    if options.binary_cache:
+        cache_file = os.path.join(get_cache_dir(), 'binary_verdicts.json')
+        if _binary_verdicts.load(cache_file):
+            verbose('Binary Cache', f'{len(_binary_verdicts.verdicts):,} files from {cache_file}', options)
 
-    while True:
-        tail(filename, options)
-        if options.retry:
-            time.sleep(1)
-        else:
-            break
+    try:
+        if options.cat:
+            cat_file(filename, options)
+            return
+
+        while True:
+            tail(filename, options)
+            if options.retry:
+                time.sleep(options.backoff.next())
+            else:
+                break
+    finally:
+        _binary_verdicts.save()
 
 if __name__ == '__main__':
     main()
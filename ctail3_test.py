@@ -1,14 +1,42 @@
+import datetime
+import os
+import sys
+import time
+import types
+
 import pytest
 
+import ctail3
 from ctail3 import (
     Options,
+    FormatDetector,
+    Backoff,
+    BinaryVerdictCache,
+    BulkScan,
+    LogReader,
+    InotifyWatcher,
+    TailState,
+    compile_name_filter,
+    create_watcher,
+    detect_file_encoding,
+    find_last_lines_offset,
+    get_tail_filename,
+    is_binary,
+    iter_mmap_lines,
+    learn_name_template,
+    next_rollover_names,
+    newest_file_in,
+    open_tail,
+    tail_once,
     format_eventlog,    
     format_cilog,
     format_lgufastlog,
     format_ncsacombinedlog,
     format_simple_log4j,
     format_simple_trace,
-    parse_lgufastlog
+    parse_lgufastlog,
+    print_format_log,
+    print_format_log_bytes
     )
 
 
@@ -119,3 +147,698 @@ def test_format_simple_trace(setup):
     """
     formatted_log, error, msg = format_simple_trace(java_trace, options)
     print(formatted_log, error, msg)
+
+def test_inotify_watcher_wakes_up_on_append(setup, tmp_path):
+    options = Options()
+    options.follow_file = True
+
+    log_file = tmp_path / "test.log"
+    log_file.write_text("first\n")
+
+    watcher = create_watcher(str(log_file), options)
+    try:
+        if not isinstance(watcher, InotifyWatcher):
+            pytest.skip("inotify is not available")
+        assert watcher.watch(str(log_file)) == True
+
+        with open(log_file, "a") as f:
+            f.write("second\n")
+
+        begin = time.monotonic()
+        watcher.wait(1.0)
+        assert time.monotonic() - begin < 0.5
+    finally:
+        watcher.close()
+
+def test_newest_file_in_lists_directory_only_when_it_changes(setup, tmp_path, monkeypatch):
+    old_log = tmp_path / "old.log"
+    old_log.write_text("old\n")
+    os.utime(old_log, (1000, 1000))
+    binary_log = tmp_path / "binary.log"
+    binary_log.write_bytes(b"\0\0\0")
+
+    assert newest_file_in(str(tmp_path)) == str(old_log)
+
+    def scandir_not_allowed(path):
+        raise AssertionError("scandir called while directory is unchanged")
+
+    with monkeypatch.context() as m:
+        m.setattr(ctail3.os, "scandir", scandir_not_allowed)
+        with open(old_log, "a") as f:
+            f.write("appended\n")
+        assert newest_file_in(str(tmp_path)) == str(old_log)
+
+    new_log = tmp_path / "new.log"
+    new_log.write_text("new\n")
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 1))
+    assert newest_file_in(str(tmp_path)) == str(new_log)
+
+def test_newest_file_in_probes_only_the_newest_candidate(setup, tmp_path, monkeypatch):
+    for i in range(10):
+        log_file = tmp_path / f"{i}.log"
+        log_file.write_text(f"{i}\n")
+        os.utime(log_file, (1000 + i, 1000 + i))
+    (tmp_path / "99.bin").write_bytes(b"\0")
+    os.utime(tmp_path / "99.bin", (2000, 2000))
+
+    probed = []
+    is_binary = ctail3.is_binary
+    monkeypatch.setattr(ctail3, "is_binary", lambda path: probed.append(path) or is_binary(path))
+
+    assert newest_file_in(str(tmp_path)) == str(tmp_path / "9.log")
+    assert probed == [str(tmp_path / "99.bin"), str(tmp_path / "9.log")]
+
+def test_is_binary_verdict_cache(setup, tmp_path, monkeypatch):
+    cache = BinaryVerdictCache()
+    monkeypatch.setattr(ctail3, "_binary_verdicts", cache)
+
+    log_file = tmp_path / "test.log"
+    log_file.write_text("0123456789\n" * 1000)
+
+    assert is_binary(str(log_file)) == False
+    assert is_binary(str(log_file)) == False
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.path = str(tmp_path / "cache" / "binary_verdicts.json")
+    assert cache.save() == True
+
+    loaded = BinaryVerdictCache()
+    assert loaded.load(cache.path) == True
+    assert loaded.verdicts == cache.verdicts
+
+def printed_lines(capsys):
+    # print_format_log() 는 줄마다 end=' ' 로 출력한다
+    return [line.strip() for line in capsys.readouterr().out.splitlines() if line.strip()]
+
+def start_follow(log_file):
+    options = Options()
+    options.follow_file = True
+    target, exist, inode = get_tail_filename(str(log_file), True, options)
+    f, error = open_tail(target, options)
+    assert error == False
+    return TailState(f, target, inode), options
+
+def test_follow_drains_renamed_file_before_switching(setup, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(ctail3, "RESOLVE_STALL_THRESHOLD", 0)
+    log_file = tmp_path / "test.log"
+    log_file.write_text("line 1\n")
+    state, options = start_follow(log_file)
+
+    writer = open(log_file, "a")
+    writer.write("line 2\n")
+    writer.flush()
+    assert tail_once(state, str(log_file), options) is None
+
+    # logrotate: rename, writer 는 아직 이전 파일에 쓰고 있음
+    os.rename(log_file, tmp_path / "test.log.1")
+    log_file.write_text("line 4\n")
+    writer.write("line 3\n")
+    writer.flush()
+
+    for _ in range(3):
+        assert tail_once(state, str(log_file), options) is None
+    writer.close()
+
+    assert state.inode == os.stat(log_file).st_ino
+    assert printed_lines(capsys) == ["line 1", "line 2", "line 3", "line 4"]
+
+def start_directory_tail(directory, options):
+    target, exist, inode = get_tail_filename(str(directory), False, options)
+    f, error = open_tail(target, options)
+    assert error == False
+    state = TailState(f, target, inode)
+    state.known_inodes = ctail3.indexed_inodes(str(directory), options.name_filter, options.recursive)
+    return state
+
+def test_directory_mode_reads_next_file_from_start(setup, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(ctail3, "RESOLVE_STALL_THRESHOLD", 0)
+    old_log = tmp_path / "cbank.log.2024-05-29-13"
+    old_log.write_text("old 1\n")
+    os.utime(old_log, (1000, 1000))
+    options = Options()
+    state = start_directory_tail(tmp_path, options)
+    assert tail_once(state, str(tmp_path), options) is None
+
+    # 시간 단위 회전: 새 파일에 이미 많은 로그가 쓰인 뒤에 넘어간다
+    new_log = tmp_path / "cbank.log.2024-05-29-14"
+    new_log.write_text("".join(f"new {i}\n" for i in range(5000)))
+    for _ in range(2):
+        assert tail_once(state, str(tmp_path), options) is None
+
+    assert state.target == str(new_log)
+    assert printed_lines(capsys) == ["old 1"] + [f"new {i}" for i in range(5000)]
+
+def test_directory_mode_tails_existing_file_from_last_2kb(setup, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(ctail3, "RESOLVE_STALL_THRESHOLD", 0)
+    other_log = tmp_path / "other.log"
+    other_log.write_text("".join(f"other {i}\n" for i in range(100000)))
+    os.utime(other_log, (1000, 1000))
+    current_log = tmp_path / "current.log"
+    current_log.write_text("current 1\n")
+    options = Options()
+    state = start_directory_tail(tmp_path, options)
+    assert state.target == str(current_log)
+    assert tail_once(state, str(tmp_path), options) is None
+
+    monkeypatch.setattr(ctail3, "DIRECTORY_RESCAN_INTERVAL", 0)
+    # tail 을 시작할 때 이미 있던 큰 파일에 한 줄이 붙으면 처음부터가 아니라 마지막 2KB 부터 읽는다
+    with open(other_log, "a") as f:
+        f.write("other appended\n")
+    for _ in range(2):
+        assert tail_once(state, str(tmp_path), options) is None
+
+    assert state.target == str(other_log)
+    lines = printed_lines(capsys)
+    assert lines[0] == "current 1"
+    assert lines[-2:] == ["other 99999", "other appended"]
+    assert len(lines) < 300
+
+def test_rollover_reads_predicted_file_from_start(setup, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(ctail3, "RESOLVE_STALL_THRESHOLD", 0)
+    old_log = tmp_path / "cbank.log.2024-05-29-13"
+    old_log.write_text("old 1\n")
+    options = Options()
+    options.rollover = "auto"
+    state = start_directory_tail(tmp_path, options)
+    assert tail_once(state, str(tmp_path), options) is None
+
+    def listing_not_allowed(*args, **kwargs):
+        raise AssertionError("directory listed while the next file name is predictable")
+
+    monkeypatch.setattr(ctail3, "newest_file_in", listing_not_allowed)
+    new_log = tmp_path / "cbank.log.2024-05-29-14"
+    new_log.write_text("".join(f"new {i}\n" for i in range(5000)))
+    for _ in range(2):
+        assert tail_once(state, str(tmp_path), options) is None
+
+    assert state.target == str(new_log)
+    assert printed_lines(capsys) == ["old 1"] + [f"new {i}" for i in range(5000)]
+
+def test_follow_keep_open_reads_deleted_file_until_a_new_one(setup, tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(ctail3, "RESOLVE_STALL_THRESHOLD", 0)
+    log_file = tmp_path / "test.log"
+    log_file.write_text("line 1\n")
+    state, options = start_follow(log_file)
+    options.keep_open = True
+
+    writer = open(log_file, "a")
+    os.unlink(log_file)
+    writer.write("line 2\n")
+    writer.flush()
+    for _ in range(2):
+        assert tail_once(state, str(log_file), options) is None
+    assert state.orphaned
+
+    writer.write("line 3\n")
+    writer.close()
+    log_file.write_text("line 4\n")
+    for _ in range(3):
+        assert tail_once(state, str(log_file), options) is None
+
+    assert not state.orphaned
+    assert state.inode == os.stat(log_file).st_ino
+    assert printed_lines(capsys) == ["line 1", "line 2", "line 3", "line 4"]
+
+def test_inotify_watcher_keeps_watching_renamed_file(setup, tmp_path):
+    log_file = tmp_path / "test.log"
+    log_file.write_text("line 1\n")
+    options = Options()
+    options.follow_file = True
+    options.keep_open = True
+    watcher = create_watcher(str(log_file), options)
+    try:
+        if not isinstance(watcher, InotifyWatcher):
+            pytest.skip("inotify is not available")
+        assert watcher.watch(str(log_file))
+        os.rename(log_file, tmp_path / "test.log.1")
+        watcher.wait(0)
+        assert watcher.watch(str(log_file))
+
+        with open(tmp_path / "test.log.1", "a") as f:
+            f.write("line 2\n")
+        started = time.monotonic()
+        watcher.wait(5)
+        assert time.monotonic() - started < 1
+    finally:
+        watcher.close()
+
+def test_follow_restarts_from_start_after_copytruncate(setup, tmp_path, capsys):
+    log_file = tmp_path / "test.log"
+    log_file.write_text("line 1\nline 2\n")
+    state, options = start_follow(log_file)
+    assert tail_once(state, str(log_file), options) is None
+
+    # copytruncate: 같은 inode 의 크기가 줄어듦
+    with open(log_file, "r+") as f:
+        f.truncate(0)
+    with open(log_file, "a") as f:
+        f.write("line 3\n")
+
+    assert tail_once(state, str(log_file), options) is None
+    assert tail_once(state, str(log_file), options) is None
+
+    assert printed_lines(capsys) == ["line 1", "line 2", "line 3"]
+
+def test_newest_file_in_with_include_exclude(setup, tmp_path):
+    for i, name in enumerate(["cbank.log.2024-05-29-13", "cbank.log.2024-05-29-14", "cbank.log.2024-05-29-15.gz", "cbank.log.bak"]):
+        (tmp_path / name).write_text(f"{name}\n")
+        os.utime(tmp_path / name, (1000 + i, 1000 + i))
+
+    name_filter = compile_name_filter(["cbank.log.*"], ["*.gz", "re:.*\\.bak"])
+    assert name_filter("cbank.log.2024-05-29-13")
+    assert not name_filter("cbank.log.2024-05-29-15.gz")
+    assert not name_filter("cbank.log.bak")
+    assert not name_filter("other.log")
+    assert compile_name_filter(None, None) is None
+
+    assert newest_file_in(str(tmp_path), name_filter) == str(tmp_path / "cbank.log.2024-05-29-14")
+
+def test_newest_file_in_recursive(setup, tmp_path, monkeypatch):
+
+    march = tmp_path / "2015-03"
+    march.mkdir()
+    (march / "vod.log").write_text("march\n")
+    os.utime(march / "vod.log", (1000, 1000))
+
+    assert newest_file_in(str(tmp_path)) == ""
+    assert newest_file_in(str(tmp_path), recursive=True) == str(march / "vod.log")
+
+    april = tmp_path / "2015-04"
+    april.mkdir()
+    (april / "vod.log").write_text("april\n")
+    assert newest_file_in(str(tmp_path), recursive=True) == str(april / "vod.log")
+
+    for i in range(10):
+        (tmp_path / "2014" / f"{i:02}").mkdir(parents=True)
+        (tmp_path / "2014" / f"{i:02}" / "vod.log").write_text("old\n")
+        os.utime(tmp_path / "2014" / f"{i:02}" / "vod.log", (1000, 1000))
+    assert newest_file_in(str(tmp_path), recursive=True) == str(april / "vod.log")
+
+    # 주기적인 재확인은 최신 파일이 있는 디렉토리만, 나머지는 mtime 이 바뀔 때만 다시 읽는다
+    scanned = []
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        scanned.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(ctail3, "DIRECTORY_RESCAN_INTERVAL", 0)
+    monkeypatch.setattr(ctail3.os, "scandir", counting_scandir)
+    assert newest_file_in(str(tmp_path), recursive=True) == str(april / "vod.log")
+    assert scanned == [str(april)]
+
+def test_follow_checks_only_the_descriptor_while_file_grows(setup, tmp_path, capsys, monkeypatch):
+    log_file = tmp_path / "test.log"
+    log_file.write_text("line 1\n")
+    state, options = start_follow(log_file)
+
+    def path_lookup_not_allowed(*args):
+        raise AssertionError("path looked up while the file grows")
+
+    monkeypatch.setattr(ctail3, "is_inode_changed", path_lookup_not_allowed)
+    monkeypatch.setattr(ctail3, "get_tail_filename", path_lookup_not_allowed)
+    for i in range(2, 5):
+        with open(log_file, "a") as f:
+            f.write(f"line {i}\n")
+        assert tail_once(state, str(log_file), options) is None
+
+    assert printed_lines(capsys) == ["line 1", "line 2", "line 3", "line 4"]
+
+def test_log_reader_carries_partial_line(setup, tmp_path):
+    log_file = tmp_path / "test.log"
+    log_file.write_bytes("첫 줄\n둘째".encode("utf-8"))
+
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "utf-8")
+    try:
+        assert list(reader.read_lines()) == ["첫 줄\n"]
+        assert reader.offset == len("첫 줄\n".encode("utf-8"))
+
+        with open(log_file, "ab") as f:
+            f.write(" 줄\n셋".encode("utf-8"))
+        assert list(reader.read_lines()) == ["둘째 줄\n"]
+        assert list(reader.read_lines(final=True)) == ["셋"]
+        assert reader.offset == os.path.getsize(log_file)
+    finally:
+        reader.close()
+
+    # CRLF 로그는 text mode 로 읽던 것처럼 '\r' 없이 읽는다
+    crlf_file = tmp_path / "crlf.log"
+    crlf_file.write_bytes("첫 줄\r\n둘째 줄\r\n셋".encode("utf-8"))
+    for read, expected in [("read_lines", ["첫 줄\n", "둘째 줄\n", "셋"]),
+                           ("read_byte_lines", [line.encode("utf-8") for line in ["첫 줄\n", "둘째 줄\n", "셋"]])]:
+        reader = LogReader(os.open(crlf_file, os.O_RDONLY), "utf-8")
+        try:
+            assert list(getattr(reader, read)(final=True)) == expected
+            assert reader.offset == os.path.getsize(crlf_file)
+        finally:
+            reader.close()
+
+@pytest.mark.parametrize("bom, codec", [(b"\xff\xfe", "utf-16-le"), (b"\xfe\xff", "utf-16-be")])
+def test_log_reader_utf16(setup, tmp_path, bom, codec):
+    # 'Ċ' (U+010A) 는 UTF-16 으로 0x0A 바이트를 포함한다
+    lines = [f"한글 Ċ line {i}\n" for i in range(5)]
+    log_file = tmp_path / "test.log"
+    log_file.write_bytes(bom + "".join(lines).encode(codec))
+
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "UTF-16")
+    try:
+        assert list(reader.read_lines(final=True)) == lines
+        assert reader.offset == os.path.getsize(log_file)
+    finally:
+        reader.close()
+
+    # 파일 중간(홀수 offset)부터 읽기 시작해도 줄 경계를 맞춘다
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "UTF-16", offset=5, skip_partial_line=True)
+    try:
+        os.lseek(reader.fileno(), 5, os.SEEK_SET)
+        assert list(reader.read_lines(final=True)) == lines[1:]
+    finally:
+        reader.close()
+
+def test_iter_mmap_lines_across_windows(setup, tmp_path, monkeypatch):
+    monkeypatch.setattr(ctail3, "MMAP_WINDOW_SIZE", ctail3.mmap.ALLOCATIONGRANULARITY)
+    lines = [f"{i:05} 로그\n" for i in range(3000)]
+    lines.insert(1000, "x" * 3 * ctail3.mmap.ALLOCATIONGRANULARITY + "\n")
+    lines.append("no newline")
+
+    log_file = tmp_path / "test.log"
+    log_file.write_text("".join(lines), encoding="utf-8")
+
+    fd = os.open(log_file, os.O_RDONLY)
+    try:
+        assert list(iter_mmap_lines(fd, "utf-8")) == lines
+    finally:
+        os.close(fd)
+
+    # CRLF 로그는 cat_file 이 text mode 로 읽던 것처럼 '\r' 없이 나온다
+    crlf_file = tmp_path / "crlf.log"
+    crlf_file.write_bytes("".join(lines).replace("\n", "\r\n").encode("utf-8"))
+    fd = os.open(crlf_file, os.O_RDONLY)
+    try:
+        assert list(iter_mmap_lines(fd, "utf-8")) == lines
+        assert list(iter_mmap_lines(fd)) == [line.encode("utf-8") for line in lines]
+    finally:
+        os.close(fd)
+
+def test_find_last_lines_offset(setup, tmp_path):
+    lines = [f"{i} " + "x" * 3000 + "\n" for i in range(100)]
+    log_file = tmp_path / "test.log"
+    log_file.write_text("".join(lines))
+    size = os.path.getsize(log_file)
+
+    fd = os.open(log_file, os.O_RDONLY)
+    try:
+        offset = find_last_lines_offset(fd, size, 3, block_size=4096)
+        assert offset == size - len("".join(lines[-3:]))
+        assert find_last_lines_offset(fd, size, 1000) == 0
+        assert find_last_lines_offset(fd, size, 0) == size
+    finally:
+        os.close(fd)
+
+def test_detect_file_encoding_probes_utf8_then_family(setup, tmp_path, monkeypatch):
+    detected = []
+    fake_chardet = types.ModuleType("chardet")
+    fake_chardet.detect = lambda data: detected.append(data) or {"encoding": "EUC-KR", "confidence": 0.99}
+    monkeypatch.setitem(sys.modules, "chardet", fake_chardet)
+
+    utf8_log = tmp_path / "utf8.log"
+    utf8_log.write_text("한글 로그\n", encoding="utf-8")
+    assert detect_file_encoding(str(utf8_log)) == "utf-8"
+
+    first = tmp_path / "cbank.log.2024-05-29-13"
+    first.write_bytes("한글 로그\n".encode("euc-kr"))
+    assert detect_file_encoding(str(first)) == "EUC-KR"
+    assert detect_file_encoding(str(first)) == "EUC-KR"
+
+    rotated = tmp_path / "cbank.log.2024-05-29-14"
+    rotated.write_bytes("다음 로그\n".encode("euc-kr"))
+    assert detect_file_encoding(str(rotated)) == "EUC-KR"
+    assert len(detected) == 1
+
+def test_log_reader_copy_to_pipe(setup, tmp_path):
+    log_file = tmp_path / "test.log"
+    log_file.write_bytes(b"line 1\nline 2\n")
+
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "utf-8")
+    r, w = os.pipe()
+    try:
+        reader.copy_to(w)
+        with open(log_file, "ab") as f:
+            f.write(b"line 3\n")
+        reader.copy_to(w)
+        assert os.read(r, 1024) == b"line 1\nline 2\nline 3\n"
+        assert reader.offset == os.path.getsize(log_file)
+    finally:
+        reader.close()
+        os.close(r)
+        os.close(w)
+
+def test_next_rollover_names(setup):
+    template = learn_name_template("sample/cbank.log.2024-05-29-13")
+    assert template == "cbank.log.%Y-%m-%d-%H"
+
+    now = datetime.datetime(2024, 5, 29, 16, 30)
+    assert next_rollover_names(template, "sample/cbank.log.2024-05-29-13", now) == [
+        "cbank.log.2024-05-29-14", "cbank.log.2024-05-29-16"]
+    assert next_rollover_names(template, "sample/cbank.log.2024-05-29-15", now) == ["cbank.log.2024-05-29-16"]
+    assert next_rollover_names("vod.%Y-%m.log", "vod.2024-12.log", now) == ["vod.2025-01.log"]
+    assert learn_name_template("EventLog.log") is None
+
+def test_backoff(setup):
+    backoff = Backoff(max_interval=0.05)
+    assert [backoff.next() for _ in range(6)] == [0, 0.01, 0.02, 0.04, 0.05, 0.05]
+    backoff.reset()
+    assert backoff.next() == 0
+
+def test_print_format_log_bytes_matches_str(setup, capsys):
+    logs = [
+        "SSAIScheduler,1.0.64,thekids_test_20240520,2024-08-29,00:00:00.000,ERROR,WorkerTask(66),,\"Stop [ad] (x) a=1, 채널\"\n",
+        "SSAIScheduler,1.0.64,,2024-08-29,00:00:00.000,INFO,ScheduleManagerScheduler(198),,\"CheckCdpChannel - start\"\n",
+        "127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] \"GET /apache_pb.gif HTTP/1.0\" 200 2326 \"-\" \"Mozilla/4.08 [en]\"\n",
+        "0x010001,8,1633072800,AbstractHandlerMethodMapping.java,시작\n",
+        "2024-05-29 13:14:38,[INFO ],HttpApiServiceImpl.java       ,requestAuthServer(95):\"code:200\"\n",
+        "그냥 한 줄",
+    ]
+    for keyword in (False, True):
+        options = Options()
+        options.keyword_coloring = keyword
+        options.keyvalue_coloring = keyword
+        options.skip_id = keyword
+        for log in logs:
+            print_format_log(log, options)
+            expected = capsys.readouterr().out
+            print_format_log_bytes(log.encode("utf-8"), options)
+            sys.stdout.buffer.flush()
+            assert capsys.readouterr().out == expected
+
+def test_log_reader_read_ahead(setup, tmp_path):
+    log_file = tmp_path / "test.log"
+    lines = [f"{i:06} {'x' * 100}\n" for i in range(20000)]
+    log_file.write_text("".join(lines[:10000]))
+
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "utf-8")
+    try:
+        reader.start_read_ahead(1)
+        assert list(reader.read_lines()) == lines[:10000]
+        assert reader.offset == os.path.getsize(log_file)
+
+        with open(log_file, "a") as f:
+            f.write("".join(lines[10000:]) + "last")
+        assert list(reader.read_lines()) == lines[10000:]
+        assert list(reader.read_lines(final=True)) == ["last"]
+        assert reader.offset == os.path.getsize(log_file)
+
+        reader.seek(0)
+        assert reader.read_ahead is None
+        reader.start_read_ahead(4)
+        assert next(reader.read_lines()) == lines[0]
+        thread = reader.read_ahead.thread
+    finally:
+        reader.close()
+    assert not thread.is_alive()
+
+def test_bulk_scan_drops_pages_behind_the_cursor(setup, tmp_path, monkeypatch):
+    granularity = ctail3.mmap.ALLOCATIONGRANULARITY
+    monkeypatch.setattr(BulkScan, "WINDOW_SIZE", granularity)
+    advices = []
+    monkeypatch.setattr(ctail3.os, "posix_fadvise", lambda fd, offset, length, advice: advices.append((offset, length, advice)))
+    sleeps = []
+    monkeypatch.setattr(ctail3.time, "sleep", sleeps.append)
+
+    lines = [f"{i:05} 로그\n" for i in range(5000)]
+    log_file = tmp_path / "test.log"
+    log_file.write_text("".join(lines))
+    size = os.path.getsize(log_file)
+
+    fd = os.open(log_file, os.O_RDONLY)
+    try:
+        scan = BulkScan(fd, max_rate=0.01)
+        assert list(iter_mmap_lines(fd, "utf-8", scan)) == lines
+    finally:
+        os.close(fd)
+
+    assert advices[0] == (0, 0, os.POSIX_FADV_SEQUENTIAL)
+    dropped = [(offset, length) for offset, length, advice in advices if advice == os.POSIX_FADV_DONTNEED]
+    assert len(dropped) > 1
+    assert dropped[0][0] == 0
+    assert all(a + b == c for (a, b), (c, _) in zip(dropped, dropped[1:]))
+    assert sum(length for _, length in dropped) == size
+    # time.sleep() 이 바로 돌아오므로 마지막 값이 전체 크기를 읽는 데 필요한 시간
+    assert 0 < sleeps[-1] <= size / (0.01 * 1024 * 1024)
+
+@pytest.mark.parametrize("policy", ["skip", "summary", "sample"])
+def test_keep_tail_catch_up(setup, tmp_path, capsys, policy):
+    log_file = tmp_path / "test.log"
+    lines = [f"2024-05-29 13:14:38,[{'ERROR' if i == 5 else 'INFO '}],A.java,run(1):\"line {i}\"\n" for i in range(1000)]
+    log_file.write_text("".join(lines))
+    options = Options()
+    options.catch_up = policy
+    options.catch_up_threshold = 0.01
+    options.sample_every = 10
+    options.lines = 3
+
+    reader = LogReader(os.open(log_file, os.O_RDONLY), "utf-8")
+    try:
+        assert ctail3.keep_tail(reader, options) == (os.path.getsize(log_file), False)
+    finally:
+        reader.close()
+
+    printed = printed_lines(capsys)
+    marker = printed[0]
+    numbers = [int(line.split('"line ')[1].split('"')[0]) for line in printed if '"line ' in line]
+    if policy == "sample":
+        assert "printing every 10th line" in marker
+        assert numbers == list(range(0, 1000, 10))
+        return
+
+    skipped = os.path.getsize(log_file) - sum(map(len, lines[-3:]))
+    assert f"skipped {skipped / 1024 / 1024:.1f} MB / 997 lines" in marker
+    if policy == "summary":
+        assert marker.endswith("INFO 996, ERROR 1\x1b[0m")
+    assert numbers == [997, 998, 999]
+
+def test_format_detector_locks_format(setup, monkeypatch):
+    calls = []
+
+    def counting(formatter, log_type):
+        def format(log, options):
+            calls.append(log_type)
+            return formatter(log, options)
+        return format, log_type
+
+    monkeypatch.setattr(ctail3, "LOG_FORMATTERS", [counting(*entry) for entry in ctail3.LOG_FORMATTERS])
+    options = Options()
+    detector = FormatDetector("test.log")
+    tomcat = "04-Feb-2024 11:54:06.612 INFO [localhost-startStop-12] org.apache.catalina.core.ApplicationContext.log Closing {}\n"
+    for i in range(FormatDetector.LOCK_MATCHES):
+        ctail3.format_log(tomcat.format(i), options, detector)
+    assert ctail3.LOG_FORMATTERS[detector.locked][1] == "TOMCAT"
+
+    calls.clear()
+    ctail3.format_log(tomcat.format("locked"), options, detector)
+    assert calls == ["TOMCAT"]
+
+    # 잠긴 형식이 실패하면 나머지를 순서대로 시도하고, TRACE 로는 잠기지 않는다
+    for i in range(FormatDetector.LOCK_MATCHES):
+        ctail3.format_log(f"\tat Main.run(Main.java:{i})\n", options, detector)
+    assert ctail3.LOG_FORMATTERS[detector.locked][1] == "TOMCAT"
+    assert detector.fallbacks == FormatDetector.LOCK_MATCHES
+
+    cilog = "name,1.0,2024-08-29,00:00:00.000,INFO,section,code,line {}\n"
+    for i in range(FormatDetector.LOCK_MATCHES):
+        ctail3.format_log_bytes(cilog.format(i).encode(), options, detector)
+    assert ctail3.LOG_FORMATTERS[detector.locked][1] == "CILOG"
+    assert detector.lock_changes == 2
+
+def test_format_classifier_routes_lines(setup):
+    logs = {
+        "0x010001,8,1633072800,AbstractHandlerMethodMapping.java,start\n": "EVENTLOG",
+        "name,1.0,2024-08-29,00:00:00.000,INFO,section,code,line\n": "CILOG",
+        "127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] \"GET / HTTP/1.0\" 200 2326 \"-\" \"Mozilla/4.08\"\n": "NCSACOMBINE",
+        "127.0.0.1 - frank [10/Oct/2000:13:55:36 -0700] \"GET / HTTP/1.0\" 200 2326\n": "NCSA",
+        "2024-05-29 13:14:38,[INFO ],HttpApiServiceImpl.java,requestAuthServer(95):\"code:200\"\n": "LOG4J",
+        "04-Feb-2024 11:54:06.612 INFO [main] org.apache.catalina.core.ApplicationContext.log Closing\n": "TOMCAT",
+        "\tat Main.run(Main.java:1)\n": "TRACE",
+    }
+    for log, log_type in logs.items():
+        for classifier, line in ((ctail3._text_classifier, log), (ctail3._bytes_classifier, log.encode())):
+            assert ctail3.LOG_FORMATTERS[next(classifier.indexes(line))][1] == log_type
+
+        formatted_log, error, msg = ctail3.LOG_FORMATTERS[next(ctail3._text_classifier.indexes(log))][0](log, Options())
+        assert not error, msg
+
+    # 모양은 맞지만 날짜가 아니면 다음 형식으로 넘어간다
+    log = "name,1.0,channel,date,time,INFO,section,code,line\n"
+    assert [ctail3.LOG_FORMATTERS[i][1] for i in ctail3._text_classifier.indexes(log)] == ["CILOG", "LGUFASTLOG", "TRACE"]
+
+def test_is_valid_date_parses_our_layouts_without_dateutil(setup, monkeypatch):
+    from dateutil import parser
+    cases = ["2024-05-29 13:14:38", "2024-05-29 13:14:38.123", "2024-05-29 13:14:38,123", "2024-8-9 1:02:03",
+             "04-Feb-2024 11:54:06.612", " 2024-08-29 00:00:00.000 ", "2024-02-30 00:00:00", "2024-05-29 24:00:00",
+             "AbstractHandlerMethodMapping.java register(543):\"Mapped", "May 4 2024", "2024-05-29 13:14:38;"]
+    expected = {}
+    for case in cases:
+        try:
+            expected[case] = parser.parse(case)
+        except ValueError:
+            expected[case] = None
+    assert [ctail3.is_valid_date(case) for case in cases] == [expected[case] for case in cases]
+
+    def dateutil_not_allowed(date_str):
+        raise AssertionError(date_str)
+
+    monkeypatch.setattr(ctail3.parser, "parse", dateutil_not_allowed)
+    assert ctail3.is_valid_date("2024-05-29 13:14:38.123") == datetime.datetime(2024, 5, 29, 13, 14, 38, 123000)
+    assert ctail3.is_valid_date("04-Feb-2024 11:54:06.612") == datetime.datetime(2024, 2, 4, 11, 54, 6, 612000)
+    assert ctail3.is_valid_date("AbstractHandlerMethodMapping.java register(543):\"Mapped") is None
+    assert ctail3.is_valid_ncsa_date("10/Oct/2000:13:55:36 -0700")
+    assert not ctail3.is_valid_ncsa_date("31/Feb/2000:13:55:36 -0700")
+
+def test_event_clock_reuses_last_second(setup, monkeypatch):
+    options = Options()
+    log = "0x010001,8,1633072800,description, with comma"
+    assert ctail3.split_eventlog(log) == (['0x010001', '8', '1633072800', 'description, with comma'], False, "")
+    assert options.event_clock.format('1633072800') == '2021-10-01 16:20:00'
+
+    calls = []
+    fromtimestamp = datetime.datetime.fromtimestamp
+
+    class CountingDatetime(datetime.datetime):
+        @classmethod
+        def fromtimestamp(cls, *args):
+            calls.append(args[0])
+            return fromtimestamp(*args)
+
+    monkeypatch.setattr(ctail3.datetime, "datetime", CountingDatetime)
+    clock = ctail3.EventClock(ctail3.parse_timezone("UTC"))
+    assert [clock.format(t) for t in ["1633072800", "1633072800.5", "1633072801", "x"]] == \
+        ['2021-10-01 07:20:00', '2021-10-01 07:20:00', '2021-10-01 07:20:01', '']
+    assert calls == [1633072800, 1633072801]
+
+    assert ctail3.EventClock(ctail3.parse_timezone("-05:30")).format("1633072800") == '2021-10-01 01:50:00'
+    with pytest.raises(Exception):
+        ctail3.parse_timezone("+25:00")
+
+def test_event_codes_decode_through_tables(setup, tmp_path, monkeypatch):
+    assert ctail3.get_event_type_string("0x010002") == 'SU/close'
+    assert ctail3.get_event_type_string("0X010002") == 'SU/close'
+    assert ctail3.get_event_type_string("0x020005") == 'RTSP-L'
+    assert ctail3.get_event_type_string("0x010000") == ''
+    assert ctail3.get_event_type_string("0x030000") == ''
+    assert ctail3.get_event_type_string("bad") == ''
+    assert [ctail3.get_event_level_string(level) for level in ["64", "08", "3", "x"]] == ['error', 'info', '', '']
+
+    ctail3.render_event_level.cache_clear()
+    assert ctail3.render_event_level("64") == ctail3.apply_color('error', 'error')
+    assert ctail3.render_event_level("8") == ctail3.apply_color('info', 'level')
+    assert ctail3.render_event_level.cache_info().currsize == 2
+
+    monkeypatch.setattr(ctail3, "colors", dict(ctail3.colors))
+    colors_file = tmp_path / "colors.json"
+    colors_file.write_text('{"event": "red"}')
+    options = Options()
+    options.colors_file = str(colors_file)
+    ctail3.render_event_type("0x010001")
+    ctail3.load_colors(options)
+    assert ctail3.render_event_type("0x010001") == '\033[0;31mSU/create\033[0m'
+    ctail3.render_event_type.cache_clear()